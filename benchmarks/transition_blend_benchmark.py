@@ -0,0 +1,101 @@
+"""
+Frames/sec of the spin and zoom transition frame kernels at 1080x1920, before and after the move to
+in-place blending into preallocated buffers and cached warp plans.
+
+    python -m benchmarks.transition_blend_benchmark
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+from components.video_processing.transition_kernels import blend_into, zoom_scales
+from components.video_processing.video_transitions import VideoTransitions
+from utils.data_structures import INSTAGRAM_RESOLUTION
+
+TRANSITION_FRAMES = 30
+ROUNDS = 3
+
+
+def legacy_rotate_frame(frame, angle, output_size):
+    h, w = frame.shape[:2]
+    M = cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1.0)
+    rotated = cv2.warpAffine(frame, M, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+    return cv2.resize(rotated, output_size)
+
+
+def legacy_zoom_frame(frame, scale):
+    h, w = frame.shape[:2]
+    new_w, new_h = int(w * scale), int(h * scale)
+    resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    if scale > 1:
+        x_start = (new_w - w) // 2
+        y_start = (new_h - h) // 2
+        return resized[y_start : y_start + h, x_start : x_start + w]
+    pad_x1 = (w - new_w) // 2
+    pad_y1 = (h - new_h) // 2
+    return cv2.copyMakeBorder(
+        resized, pad_y1, h - new_h - pad_y1, pad_x1, w - new_w - pad_x1, cv2.BORDER_CONSTANT, value=0
+    )
+
+
+def legacy_blend(frame1, frame2, progress):
+    return (frame1.astype(np.float32) * (1 - progress) + frame2.astype(np.float32) * progress).astype(np.uint8)
+
+
+def legacy_spin_frame(i, n, frame1, frame2):
+    progress = i / n
+    h, w = frame1.shape[:2]
+    rotated1 = legacy_rotate_frame(frame1, 360 * progress, (w, h))
+    rotated2 = legacy_rotate_frame(frame2, -360 + 360 * progress, (w, h))
+    return legacy_blend(rotated1, rotated2, progress)
+
+
+def legacy_zoom_blend_frame(i, n, frame1, frame2):
+    progress = i / n
+    scale1, scale2 = zoom_scales(progress, "in_out")
+    return legacy_blend(legacy_zoom_frame(frame1, scale1), legacy_zoom_frame(frame2, scale2), progress)
+
+
+def legacy_blend_frame(i, n, frame1, frame2):
+    return legacy_blend(frame1, frame2, i / n)
+
+
+def frames_per_second(blend_frame, frame1, frame2):
+    best = 0
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for i in range(TRANSITION_FRAMES):
+            blend_frame(i, TRANSITION_FRAMES, frame1, frame2)
+        best = max(best, TRANSITION_FRAMES / (time.perf_counter() - start))
+    return best
+
+
+def main():
+    width, height = INSTAGRAM_RESOLUTION
+    rng = np.random.default_rng(0)
+    frame1 = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    frame2 = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    transitions = VideoTransitions()
+    buffers = transitions.frame_buffers
+
+    cases = [
+        (
+            "blend only",
+            legacy_blend_frame,
+            lambda i, n, f1, f2: blend_into(f1, f2, i / n, buffers.get("blend", f1.shape)),
+        ),
+        ("spin frame", legacy_spin_frame, transitions.spin_frame),
+        ("zoom frame", legacy_zoom_blend_frame, transitions.zoom_blend_frame),
+    ]
+    print(f"{width}x{height}, {TRANSITION_FRAMES} frames, best of {ROUNDS}")
+    print(f"{'kernel':<12}{'before fps':>12}{'after fps':>12}{'speedup':>10}")
+    for name, before, after in cases:
+        before_fps = frames_per_second(before, frame1, frame2)
+        after_fps = frames_per_second(after, frame1, frame2)
+        print(f"{name:<12}{before_fps:>12.1f}{after_fps:>12.1f}{after_fps / before_fps:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
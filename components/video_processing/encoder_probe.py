@@ -0,0 +1,173 @@
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import asdict
+
+from utils.data_structures import X264_PRESETS, EncoderCapabilities
+from utils.media_cache import CACHE_ROOT
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
+
+
+class EncoderProbe:
+    """
+    One-time probe of the H.264/HEVC encoders the local ffmpeg can actually use, with their options, the
+    named values of their -preset option and a short synthetic benchmark of the libx264 presets. The result,
+    failed probes included, is stored on disk and reused until the ffmpeg binary (path, mtime or size)
+    changes, so render paths no longer shell out to pick a codec.
+    """
+
+    CAPABILITIES_FILE = "encoder_capabilities.json"
+    BENCHMARK_PRESETS = X264_PRESETS[:7]  # up to slow, slower presets take too long to time at start
+    BENCHMARK_FRAMES = 60
+    TEST_SOURCE = "testsrc2=size=720x1280:rate=30"
+    ENCODER_LINE = re.compile(r"^\s*V\S*\s+(\S+)\s+.*\(codec (?:h264|hevc)\)")
+    OPTION_LINE = re.compile(r"^\s{1,2}-(\S+)\s+<")
+    OPTION_VALUE_LINE = re.compile(r"^\s{3,}(\S+)\s+(?:-?\d+\s+)?E\.\.V")
+
+    def __init__(self, cache_root=CACHE_ROOT):
+        self.capabilities_path = os.path.join(cache_root, self.CAPABILITIES_FILE)
+        self.logger = logging.getLogger(__name__)
+        self._capabilities = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _binary_key() -> str | None:
+        path = shutil.which("ffmpeg")
+        if path is None:
+            return None
+        stat = os.stat(path)
+        return f"{os.path.realpath(path)}|{stat.st_mtime_ns}|{stat.st_size}"
+
+    @staticmethod
+    def _run(cmd) -> str:
+        return subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+
+    @classmethod
+    def parse_encoders(cls, output) -> list[str]:
+        """H.264/HEVC video encoder names from ``ffmpeg -encoders``."""
+        return [match.group(1) for match in map(cls.ENCODER_LINE.match, output.splitlines()) if match]
+
+    @classmethod
+    def parse_options(cls, output) -> list[str]:
+        """Private option names from ``ffmpeg -h encoder=<name>``."""
+        return [match.group(1) for match in map(cls.OPTION_LINE.match, output.splitlines()) if match]
+
+    @classmethod
+    def parse_presets(cls, output) -> list[str]:
+        """Named values of the -preset option, empty when the encoder takes free-form names (libx264)."""
+        presets = []
+        in_preset = False
+        for line in output.splitlines():
+            option = cls.OPTION_LINE.match(line)
+            if option:
+                in_preset = option.group(1) == "preset"
+                continue
+            value = cls.OPTION_VALUE_LINE.match(line)
+            if in_preset and value:
+                presets.append(value.group(1))
+        return presets
+
+    def _encode_cmd(self, encoder, frames, extra_args=()) -> list[str]:
+        return [
+            "ffmpeg",
+            "-hide_banner",
+            "-f",
+            "lavfi",
+            "-i",
+            self.TEST_SOURCE,
+            "-frames:v",
+            str(frames),
+            "-c:v",
+            encoder,
+            *extra_args,
+            "-pix_fmt",
+            "yuv420p",
+            "-f",
+            "null",
+            "-",
+        ]
+
+    def _encoder_works(self, encoder) -> bool:
+        # Listed hardware encoders fail at open time without a matching device or driver
+        try:
+            self._run(self._encode_cmd(encoder, 1))
+            return True
+        except (OSError, subprocess.CalledProcessError):
+            return False
+
+    def benchmark_presets(self) -> dict[str, float]:
+        preset_fps = {}
+        for preset in self.BENCHMARK_PRESETS:
+            started = time.perf_counter()
+            try:
+                self._run(self._encode_cmd("libx264", self.BENCHMARK_FRAMES, ["-preset", preset]))
+            except (OSError, subprocess.CalledProcessError):
+                continue
+            preset_fps[preset] = round(self.BENCHMARK_FRAMES / (time.perf_counter() - started), 1)
+        return preset_fps
+
+    def _probe_binary(self, binary_key) -> EncoderCapabilities:
+        self.logger.info("Probing ffmpeg encoders, this runs once per ffmpeg binary.")
+        encoders = {}
+        presets = {}
+        for encoder in self.parse_encoders(self._run(["ffmpeg", "-hide_banner", "-encoders"])):
+            if self._encoder_works(encoder):
+                encoder_help = self._run(["ffmpeg", "-hide_banner", "-h", f"encoder={encoder}"])
+                encoders[encoder] = self.parse_options(encoder_help)
+                presets[encoder] = self.parse_presets(encoder_help)
+        preset_fps = self.benchmark_presets() if "libx264" in encoders else {}
+        return EncoderCapabilities(ffmpeg=binary_key, encoders=encoders, presets=presets, preset_fps=preset_fps)
+
+    def _load(self, binary_key) -> EncoderCapabilities | None:
+        try:
+            with open(self.capabilities_path) as f:
+                capabilities = EncoderCapabilities(**json.load(f))
+        except (OSError, TypeError, json.JSONDecodeError):
+            return None
+        return capabilities if capabilities.ffmpeg == binary_key else None
+
+    def _save(self, capabilities):
+        os.makedirs(os.path.dirname(self.capabilities_path), exist_ok=True)
+        temp_path = f"{self.capabilities_path}.{os.getpid()}.{threading.get_ident()}"
+        with open(temp_path, "w") as f:
+            json.dump(asdict(capabilities), f)
+        os.replace(temp_path, self.capabilities_path)
+
+    def probe(self) -> EncoderCapabilities:
+        try:
+            binary_key = self._binary_key()
+        except OSError:
+            binary_key = None
+        if binary_key is None:
+            self.logger.warning("FFmpeg is not installed or not found in PATH.")
+            return EncoderCapabilities(ffmpeg="", encoders={}, presets={}, preset_fps={})
+
+        with self._lock:
+            if self._capabilities is None or self._capabilities.ffmpeg != binary_key:
+                capabilities = self._load(binary_key)
+                if capabilities is None:
+                    try:
+                        capabilities = self._probe_binary(binary_key)
+                    except (OSError, subprocess.CalledProcessError) as e:
+                        # Stored as well, so a broken binary is not probed again at every start
+                        self.logger.warning(f"FFmpeg encoder probe failed: {e}")
+                        capabilities = EncoderCapabilities(ffmpeg=binary_key, encoders={}, presets={}, preset_fps={})
+                    try:
+                        self._save(capabilities)
+                    except OSError as e:
+                        self.logger.warning(f"Failed to save encoder capabilities: {e}")
+                self._capabilities = capabilities
+            return self._capabilities
+
+
+_default_probe = EncoderProbe()
+
+
+def probe_encoders() -> EncoderCapabilities:
+    return _default_probe.probe()
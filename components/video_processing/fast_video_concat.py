@@ -1,12 +1,19 @@
 import logging
 import os
-import shutil
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Optional
 
-from PyQt5.QtCore import QProcess
-
-from utils.data_structures import DataTypeEnum, Segment
+from components.video_processing.ffmpeg_jobs import FFmpegJobError, FFmpegJobRunner
+from components.video_processing.media_probe import probe_keyframes, probe_media
+from components.video_processing.proxy_media import ProxyMedia
+from utils.data_structures import (
+    RENDER_PROFILES,
+    DataTypeEnum,
+    RenderProfile,
+    RenderProfileEnum,
+    Segment,
+)
+from utils.media_cache import CACHE_ROOT, DiskCache, cache_key, file_fingerprint
+from utils.workspace import SCRATCH_ROOT, job_workspace
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
 # TODO:
@@ -14,53 +21,192 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(me
 
 
 class FFmpegConcat:
-    def __init__(self):
-        self.proc = None
+    SEGMENT_CACHE = "segments"
+    SEGMENT_CACHE_MAX_BYTES = 5 * 1024**3
+    # ffprobe profile names of the 8-bit 4:2:0 sources libx264 can match
+    X264_PROFILES = {"Constrained Baseline": "baseline", "Main": "main", "High": "high"}
+    # libx264 B-frame settings giving each reorder delay, the decoder cannot change it at a splice
+    X264_REORDER_ARGS = {
+        0: ["-bf", "0"],
+        1: ["-bf", "3", "-b-pyramid", "none"],
+        2: ["-bf", "3", "-b-pyramid", "normal"],
+    }
+
+    def __init__(
+        self,
+        proxy_media: ProxyMedia = None,
+        profile: RenderProfile = RENDER_PROFILES[RenderProfileEnum.PREVIEW],
+        cache_root=CACHE_ROOT,
+        smart_cut=False,
+        scratch_root=SCRATCH_ROOT,
+        timeout=None,
+    ):
+        self.jobs = FFmpegJobRunner(timeout)
+        self.proxy_media = proxy_media
+        self.profile = profile
+        self.smart_cut = smart_cut
+        self.scratch_root = scratch_root
+        self.segment_cache = DiskCache(self.SEGMENT_CACHE, self.SEGMENT_CACHE_MAX_BYTES, cache_root)
         self.logger = logging.getLogger(__name__)
 
     def _run_ffmpeg(self, args: List[str]) -> bool:
-        proc = QProcess()
-        proc.start("ffmpeg", args)
-        proc.waitForFinished(-1)
-        success = proc.exitCode() == 0
-        if not success:
-            self.logger.error(f"FFmpeg failed: {bytes(proc.readAllStandardError()).decode()}")
-        return success
+        return self.jobs.run(args)
 
-    def process_video_segment(self, tmp_dir, i, seg):
-        tmp_file = os.path.join(tmp_dir, f"video_part_{i}.mp4")
-        args = [
-            "-hide_banner",
-            "-y",
-            "-ss",
-            str(seg.start),
-            "-to",
-            str(seg.end),
-            "-i",
-            seg.content,
+    def cancel(self):
+        """Abort the job: running ffmpeg processes are killed and the concat returns a failure."""
+        self.jobs.cancel()
+
+    def segment_encode_args(self) -> list[str]:
+        width, height = self.profile.resolution
+        return [
             "-map",
             "0:v:0",
             "-an",
-            "-r",
-            "30",
+            "-vf",
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1",
             "-vsync",
             "cfr",
             "-fflags",
             "+genpts",
-            "-c:v",
-            "libx264",
-            "-preset",
-            "ultrafast",
-            "-crf",
-            "18",
-            "-pix_fmt",
-            "yuv420p",
-            tmp_file,
+            *self.profile.video_args(),
         ]
-        self.logger.info("Trimming video: " + " ".join(["ffmpeg"] + args))
-        if not self._run_ffmpeg(args):
-            return None, 0.0
-        return i, tmp_file, seg.end - seg.start, DataTypeEnum.VIDEO
+
+    def edge_encode_args(self, source) -> list[str] | None:
+        """
+        Encode arguments of the partial GOPs around stream copied packets of the source, pinned to its H.264
+        profile, level and B-frame reorder delay so the spliced stream decodes as one. None when the packets
+        cannot be spliced into segments encoded with the profile.
+        """
+        info = probe_media(source)
+        if (
+            info is None
+            or info.video_codec != "h264"
+            or info.pix_fmt != "yuv420p"
+            or (info.width, info.height) != tuple(self.profile.resolution)
+            or not info.r_fps == info.avg_fps == self.profile.fps
+            or info.rotation != 0
+        ):
+            return None
+        x264_profile = self.X264_PROFILES.get(info.video_profile)
+        reorder_args = self.X264_REORDER_ARGS.get(info.has_b_frames)
+        if x264_profile is None or info.video_level is None or reorder_args is None:
+            self.logger.info(f"Cannot match the H.264 parameters of {source}, encoding it in full")
+            return None
+        level = f"{info.video_level / 10:.1f}"
+        return [*self.segment_encode_args(), "-profile:v", x264_profile, "-level", level, *reorder_args]
+
+    @staticmethod
+    def smart_cut_plan(keyframes, start, end, frame_duration) -> list[tuple[float, float, bool]] | None:
+        """
+        Split [start, end] into (start, end, copy) pieces: the GOPs fully inside the trim are stream copied,
+        only the partial GOPs at each edge are encoded. None when the trim does not hold a whole GOP.
+        """
+        tolerance = frame_duration / 2
+        inner = [k for k in keyframes if start - tolerance <= k <= end + tolerance]
+        if len(inner) < 2 or inner[-1] - inner[0] < frame_duration:
+            return None
+        first_key, last_key = inner[0], inner[-1]
+        pieces = []
+        if first_key - start >= tolerance:
+            pieces.append((start, first_key, False))
+        pieces.append((first_key, last_key, True))
+        if end - last_key >= tolerance:
+            pieces.append((last_key, end, False))
+        return pieces
+
+    def _smart_cut_pieces(self, source, seg):
+        """The smart cut plan of the trim and the encode arguments of its edges, or (None, None)."""
+        if not self.smart_cut:
+            return None, None
+        edge_args = self.edge_encode_args(source)
+        keyframes = probe_keyframes(source) if edge_args else None
+        if not keyframes:
+            return None, None
+        pieces = self.smart_cut_plan(keyframes, seg.start, seg.end, 1 / self.profile.fps)
+        return pieces, edge_args if pieces else None
+
+    def _encode_smart_cut(self, source, pieces, edge_args, tmp_dir, i, out_file) -> bool:
+        """
+        Write each piece as Matroska, which keeps its timestamps, then stitch them by stream copy. The concat
+        demuxer passes the parameter sets of every piece on, they end up in band in the MP4.
+        """
+        piece_files = []
+        list_name = f"smart_cut_{i}.txt"
+        try:
+            for n, (start, end, copy) in enumerate(pieces):
+                piece_file = os.path.join(tmp_dir, f"smart_cut_{i}_{n}.mkv")
+                piece_files.append(piece_file)
+                if copy:
+                    # Seeking just past the keyframe lands on it, stream copy always starts at a keyframe. A copy
+                    # cut by duration runs into the next GOP through B-frames, count the frames instead
+                    frames = round((end - start) * self.profile.fps)
+                    args = ["-hide_banner", "-y", "-ss", str(start + 0.001), "-i", source, "-frames:v", str(frames)]
+                    args += ["-map", "0:v:0", "-an", "-c", "copy", piece_file]
+                else:
+                    args = ["-hide_banner", "-y", "-ss", str(start), "-to", str(end), "-i", source]
+                    args += [*edge_args, piece_file]
+                self.logger.info(f"Smart cut piece {n} of segment {i}: {' '.join(['ffmpeg'] + args)}")
+                if not self._run_ffmpeg(args):
+                    return False
+
+            args = ["-hide_banner", "-y", *self.concat_input(tmp_dir, list_name, piece_files), "-c", "copy", out_file]
+            return self._run_ffmpeg(args)
+        finally:
+            for path in piece_files + [os.path.join(tmp_dir, list_name)]:
+                try:
+                    if os.path.exists(path):
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def process_video_segment(self, tmp_dir, i, seg):
+        """
+        Trim and encode one video segment. Encoded segments are cached across previews, keyed by the source
+        fingerprint, the trim and the encode settings, so only blocks that changed are encoded again.
+        With smart cut, compatible sources only encode the partial GOPs at the edges of the trim.
+        """
+        source = self.proxy_media.resolve(seg.content) if self.proxy_media is not None else seg.content
+        encode_args = self.segment_encode_args()
+        try:
+            pieces, edge_args = self._smart_cut_pieces(source, seg)
+            key = cache_key(file_fingerprint(source), seg.start, seg.end, encode_args, edge_args or "")
+        except OSError as e:
+            self.logger.error(f"Cannot read video segment {source}: {e}")
+            return i, None, 0.0, DataTypeEnum.VIDEO
+
+        with self.segment_cache.lock(key):
+            cached_path = self.segment_cache.get(key, ".mp4")
+            if cached_path is not None:
+                self.logger.info(f"Using cached video segment {i}: {cached_path}")
+                return i, cached_path, seg.end - seg.start, DataTypeEnum.VIDEO
+
+            tmp_file = self.segment_cache.temp_path_for(key, ".mp4")
+            if pieces:
+                if not self._encode_smart_cut(source, pieces, edge_args, tmp_dir, i, tmp_file):
+                    self.segment_cache.discard(tmp_file)
+                    return i, None, 0.0, DataTypeEnum.VIDEO
+                segment_file = self.segment_cache.commit(tmp_file, key, ".mp4")
+                return i, segment_file, seg.end - seg.start, DataTypeEnum.VIDEO
+
+            args = [
+                "-hide_banner",
+                "-y",
+                "-ss",
+                str(seg.start),
+                "-to",
+                str(seg.end),
+                "-i",
+                source,
+                *encode_args,
+                tmp_file,
+            ]
+            self.logger.info("Trimming video: " + " ".join(["ffmpeg"] + args))
+            if not self._run_ffmpeg(args):
+                self.segment_cache.discard(tmp_file)
+                return i, None, 0.0, DataTypeEnum.VIDEO
+            segment_file = self.segment_cache.commit(tmp_file, key, ".mp4")
+        return i, segment_file, seg.end - seg.start, DataTypeEnum.VIDEO
 
     def process_audio_segment(self, tmp_dir, i, seg):
         tmp_file = os.path.join(tmp_dir, f"audio_part_{i}.mp4")
@@ -82,6 +228,22 @@ class FFmpegConcat:
             return i, None, None, DataTypeEnum.AUDIO
         return i, tmp_file, None, DataTypeEnum.AUDIO
 
+    @staticmethod
+    def concat_input(tmp_dir, list_name, files) -> list[str]:
+        """Write a concat demuxer list of the files and return the input arguments reading it."""
+        list_path = os.path.join(tmp_dir, list_name)
+        with open(list_path, "w", encoding="utf-8") as f:
+            for path in files:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        return ["-f", "concat", "-safe", "0", "-i", list_path]
+
+    @staticmethod
+    def _trim_segment(process_segment, tmp_dir, i, seg):
+        result = process_segment(tmp_dir, i, seg)
+        if result[1] is None:
+            raise FFmpegJobError(f"Trimming failed on {result[3].value} segment {i}")
+        return result
+
     def concat_segments(
         self,
         video_segments: List[Segment],
@@ -90,120 +252,47 @@ class FFmpegConcat:
     ) -> tuple[bool, float]:
         """
         Concatenate video segments and optional audio segments (with same trim info).
+        Intermediate files live in a private workspace under the scratch root, so several jobs can run at once.
         """
         if not video_segments:
             self.logger.error("No video segments provided")
             return False, 0.0
 
-        tmp_dir = "preview/temp"
-        os.makedirs(tmp_dir, exist_ok=True)
-        tmp_audio_files = [None] * len(audio_segments)
-        tmp_video_files = [None] * len(video_segments)
-
-        # Step 1: trim video segments into MKV
-        duration = 0.0
-
-        # Run trimming in parallel threads
-        with ThreadPoolExecutor(max_workers=os.cpu_count() - 2) as executor:
-            futures = {
-                executor.submit(self.process_video_segment, tmp_dir, i, seg): i for i, seg in enumerate(video_segments)
-            }
-            if audio_segments:
-                futures |= {
-                    executor.submit(self.process_audio_segment, tmp_dir, i, seg): i
-                    for i, seg in enumerate(audio_segments, start=len(futures))
-                }
-            for future in as_completed(futures):
-                i, tmp_data, seg_duration, data_type = future.result()
-                if tmp_data is None:
-                    self.logger.error(f"Trimming failed on segment {i}")
-                    return False, 0.0
-                if data_type == DataTypeEnum.VIDEO:
-                    tmp_video_files[i] = tmp_data
-                    duration += seg_duration
-                elif data_type == DataTypeEnum.AUDIO:
-                    tmp_audio_files[i - len(tmp_video_files)] = tmp_data
+        with job_workspace("fast_preview_", self.scratch_root) as tmp_dir:
+            return self._concat_segments(tmp_dir, video_segments, out_path, audio_segments)
 
+    def _concat_segments(
+        self,
+        tmp_dir: str,
+        video_segments: List[Segment],
+        out_path: str,
+        audio_segments: Optional[List[Segment]],
+    ) -> tuple[bool, float]:
+        # Step 1: trim all segments in one task group, the first failure aborts the others
+        trims = [(self.process_video_segment, tmp_dir, i, seg) for i, seg in enumerate(video_segments)]
+        trims += [(self.process_audio_segment, tmp_dir, i, seg) for i, seg in enumerate(audio_segments or [])]
+        try:
+            results = self.jobs.map(self._trim_segment, trims, max_workers=max(1, os.cpu_count() - 2))
+        except FFmpegJobError as e:
+            self.logger.error(str(e))
+            return False, 0.0
+
+        tmp_video_files = [path for _, path, _, data_type in results if data_type == DataTypeEnum.VIDEO]
+        tmp_audio_files = [path for _, path, _, data_type in results if data_type == DataTypeEnum.AUDIO]
+        duration = sum(seg_duration for _, _, seg_duration, data_type in results if data_type == DataTypeEnum.VIDEO)
         self.logger.info(f"All audio and video segments trimmed. Total duration of clip: {duration:.2f}s")
 
-        # Step 2: concatenate video parts
-        video_list_path = os.path.join(tmp_dir, "video_list.txt")
-        with open(video_list_path, "w", encoding="utf-8") as f:
-            for tmp in tmp_video_files:
-                f.write(f"file '{os.path.abspath(tmp)}'\n")
-        concat_video = os.path.join(tmp_dir, "concat_video.mp4")
-        args = ["-hide_banner", "-y", "-f", "concat", "-safe", "0", "-i", video_list_path, "-c", "copy", concat_video]
-        self.logger.info(f"Concatenating video: {' '.join(['ffmpeg'] + args)}")
+        # Step 2: join the video parts, attach the joined audio parts and move the index to the front,
+        # reading both segment lists directly in a single stream copy
+        args = ["-hide_banner", "-y", *self.concat_input(tmp_dir, "video_list.txt", tmp_video_files)]
+        maps = ["-map", "0:v:0"]
+        if tmp_audio_files:
+            args += self.concat_input(tmp_dir, "audio_list.txt", tmp_audio_files)
+            maps += ["-map", "1:a:0"]
+        args += [*maps, "-c", "copy", "-movflags", "+faststart", out_path]
+        self.logger.info(f"Concatenating and muxing: {' '.join(['ffmpeg'] + args)}")
         if not self._run_ffmpeg(args):
             return False, 0.0
 
-        # Step 3: if audio segments provided, trim and concatenate audio
-        final_audio = None
-        if audio_segments:
-            audio_list_path = os.path.join(tmp_dir, "audio_list.txt")
-            with open(audio_list_path, "w", encoding="utf-8") as f:
-                for tmp in tmp_audio_files:
-                    f.write(f"file '{os.path.abspath(tmp)}'\n")
-
-            final_audio = os.path.join(tmp_dir, "concat_audio.mp4")
-            args = [
-                "-hide_banner",
-                "-y",
-                "-f",
-                "concat",
-                "-safe",
-                "0",
-                "-i",
-                audio_list_path,
-                "-c",
-                "copy",
-                final_audio,
-            ]
-            self.logger.info(f"Concatenating audio: {' '.join(['ffmpeg'] + args)}")
-            if not self._run_ffmpeg(args):
-                return False, 0.0
-
-        # Step 4: mux video + audio into final output
-        if final_audio:
-            args = [
-                "-hide_banner",
-                "-y",
-                "-i",
-                concat_video,
-                "-i",
-                final_audio,
-                "-c:v",
-                "copy",
-                "-c:a",
-                "copy",
-                "-map",
-                "0:v:0",
-                "-map",
-                "1:a:0",
-                out_path,
-            ]
-            self.logger.info(f"Muxing final video + audio: {' '.join(['ffmpeg'] + args)}")
-            if not self._run_ffmpeg(args):
-                return False, duration
-        else:
-            shutil.move(concat_video, out_path)
-
-        # Step 5: cleanup temp files
-        for tmp in (
-            tmp_video_files
-            + tmp_audio_files
-            + [
-                video_list_path,
-                audio_list_path if audio_segments else "",
-                concat_video,
-                final_audio if final_audio else "",
-            ]
-        ):
-            try:
-                if tmp and os.path.exists(tmp):
-                    os.remove(tmp)
-            except OSError:
-                pass
-
         self.logger.info(f"✅ Final video with optional trimmed audio: {out_path}")
         return True, duration
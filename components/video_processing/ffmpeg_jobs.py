@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, CancelledError, ThreadPoolExecutor, wait
+
+from utils.tracing import in_trace_context
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
+
+
+class FFmpegJobError(RuntimeError):
+    pass
+
+
+class FFmpegJobRunner:
+    """
+    One cancellable job of ffmpeg invocations, run as asyncio subprocesses on a background event loop shared
+    by all jobs, so callers need no Qt event loop. Each process gets its own session and the whole process
+    group is killed when the job is cancelled or runs past its timeout.
+
+    On Windows there are no sessions and only the ffmpeg process itself is killed, processes it started would
+    be left running. The invocations of this app start none, any that do (e.g. pipes to external tools) need
+    a job object around them.
+    """
+
+    _loop = None
+    _loop_lock = threading.Lock()
+
+    def __init__(self, timeout=None, binary="ffmpeg"):
+        self.binary = binary
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.logger = logging.getLogger(__name__)
+        self._futures = set()
+        self._futures_lock = threading.Lock()
+        self._cancelled = threading.Event()
+
+    @classmethod
+    def event_loop(cls) -> asyncio.AbstractEventLoop:
+        with cls._loop_lock:
+            if cls._loop is None:
+                cls._loop = asyncio.new_event_loop()
+                threading.Thread(target=cls._loop.run_forever, name="ffmpeg-jobs", daemon=True).start()
+            return cls._loop
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def _remaining(self):
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    @staticmethod
+    def _kill(proc):
+        try:
+            if os.name == "posix":
+                os.killpg(proc.pid, signal.SIGKILL)
+            else:
+                proc.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    async def run_async(self, args) -> bool:
+        """Run one invocation on the job loop. False on failure or timeout, CancelledError kills the process tree."""
+        proc = await asyncio.create_subprocess_exec(
+            self.binary,
+            *args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+        try:
+            async with asyncio.timeout(self._remaining()):
+                _, stderr = await proc.communicate()
+        except TimeoutError:
+            self.logger.error(f"FFmpeg timed out: {' '.join([self.binary] + args)}")
+            return False
+        finally:
+            if proc.returncode is None:
+                self._kill(proc)
+                await proc.wait()
+
+        if proc.returncode != 0:
+            self.logger.error(f"FFmpeg failed: {stderr.decode(errors='replace')}")
+            return False
+        return True
+
+    def _submit(self, coroutine):
+        with self._futures_lock:
+            if self.cancelled:
+                coroutine.close()
+                raise CancelledError()
+            future = asyncio.run_coroutine_threadsafe(coroutine, self.event_loop())
+            self._futures.add(future)
+        try:
+            return future.result()
+        finally:
+            with self._futures_lock:
+                self._futures.discard(future)
+
+    def run(self, args) -> bool:
+        """Run one invocation from any thread but the job loop and wait for it; False once the job is cancelled."""
+        try:
+            return self._submit(self.run_async(args))
+        except CancelledError:
+            return False
+
+    def map(self, fn, items, max_workers=None) -> list:
+        """
+        Call fn(*item) for every item on worker threads, in the caller's trace context. The first exception
+        cancels the job, killing the invocations of the other calls, and is raised once every worker has
+        returned, so none is left writing into a workspace the caller removes.
+        """
+        if self.cancelled:
+            raise FFmpegJobError("Job was cancelled")
+        call = in_trace_context(fn)
+        failed = None
+        with ThreadPoolExecutor(max_workers or len(items) or 1, thread_name_prefix="ffmpeg-job") as pool:
+            futures = [pool.submit(call, *item) for item in items]
+            try:
+                done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            except BaseException:
+                self.cancel()
+                raise
+            failed = next((f for f in futures if f in done and f.exception() is not None), None)
+            if failed is not None:
+                self.cancel()
+                for future in futures:
+                    future.cancel()
+        # Leaving the pool waited for the calls still running
+        if failed is not None:
+            raise failed.exception()
+        return [future.result() for future in futures]
+
+    def cancel(self):
+        """Kill the running invocations of the job and refuse new ones."""
+        with self._futures_lock:
+            self._cancelled.set()
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,178 @@
+import logging
+import os
+import subprocess
+import tempfile
+from dataclasses import replace
+
+import numpy as np
+from PIL import Image
+
+from components.video_processing.media_probe import probe_media
+from components.video_processing.video_preprocessing import VideoPreprocessing
+from components.video_processing.video_processing_utils import get_codec
+from utils.data_structures import (
+    RENDER_PROFILES,
+    DataTypeEnum,
+    MediaClip,
+    RenderProfile,
+    RenderProfileEnum,
+    TransitionTypeEnum,
+)
+from utils.tracing import span
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
+
+
+class FFmpegRenderEngine:
+    """
+    Alternative to the moviepy render path: the timeline is compiled into a single ffmpeg
+    filter_complex invocation, so no output frame is pulled through Python.
+    Trims, letterboxing to the reel resolution, transitions and the audio window are all done by ffmpeg.
+    """
+
+    TRANSITION_DURATION = 1  # same as VideoPostProcessing.apply_transitions
+    # Transitions overlapping both clips; spin has no xfade counterpart, radial is the closest rotating wipe
+    XFADE_TRANSITIONS = {
+        TransitionTypeEnum.SLIDE: "slideleft",
+        TransitionTypeEnum.ZOOM: "zoomin",
+        TransitionTypeEnum.SPIN: "radial",
+    }
+    # Transitions fading through black without overlapping the clips
+    FADE_TRANSITIONS = (TransitionTypeEnum.FADE, TransitionTypeEnum.CROSS_FADE)
+
+    def __init__(
+        self,
+        video_preprocessing: VideoPreprocessing = None,
+        profile: RenderProfile = RENDER_PROFILES[RenderProfileEnum.FINAL],
+    ):
+        self.video_preprocessing = video_preprocessing or VideoPreprocessing(profile=profile)
+        self.profile = profile
+        self.logger = logging.getLogger(__name__)
+
+    def plan(self, entries: dict[str, MediaClip], media_dir) -> list[tuple[str, MediaClip]]:
+        """Resolve media paths and clamp trims to the media duration, the way process_entry does."""
+        timeline = []
+        for file_path, entry in entries.items():
+            full_path = os.path.join(media_dir, file_path)
+            end = entry.end
+            if entry.type == DataTypeEnum.VIDEO.value:
+                info = probe_media(full_path)
+                if info is None:
+                    self.logger.info(f"Error processing {file_path}: could not probe media")
+                    continue
+                if end > info.duration:
+                    self.logger.warning(
+                        f"End time {end}s exceeds video duration {info.duration:.2f}s for file: {file_path}",
+                    )
+                    end = info.duration
+            elif entry.type != DataTypeEnum.PHOTO.value:
+                self.logger.info(f"Error processing {file_path}: Unsupported media type: {entry.type}")
+                continue
+            timeline.append((full_path, replace(entry, end=end)))
+        return timeline
+
+    def _transition_duration(self, previous_duration, duration):
+        return min(self.TRANSITION_DURATION, previous_duration, duration)
+
+    def _xfade_duration(self, durations, transitions, i):
+        """
+        Overlap of clips i - 1 and i, clamped like TimelineCompositor: a clip overlapped on both sides gives
+        each window at most half of its length, and windows are whole frames.
+        """
+        limit1 = durations[i - 1] / 2 if i > 1 and transitions[i - 2] in self.XFADE_TRANSITIONS else durations[i - 1]
+        limit2 = (
+            durations[i] / 2 if i + 1 < len(durations) and transitions[i] in self.XFADE_TRANSITIONS else durations[i]
+        )
+        window = min(self.TRANSITION_DURATION, limit1, limit2)
+        frames = int(window * self.profile.fps)
+        return window if frames == window * self.profile.fps else frames / self.profile.fps
+
+    def build_command(
+        self,
+        timeline: list[tuple[str, MediaClip]],
+        output_path,
+        codec,
+        audio_path="",
+        audio_start=0,
+    ) -> list[str]:
+        """Compile the timeline into an ffmpeg command. Photo entries must point to already formatted frames."""
+        target_w, target_h = self.profile.resolution
+        fps = self.profile.fps
+        durations = [entry.end - entry.start for _, entry in timeline]
+        transitions = [entry.transition for _, entry in timeline]
+        input_args = []
+        filters = []
+
+        for i, (path, entry) in enumerate(timeline):
+            duration = durations[i]
+            if entry.type == DataTypeEnum.PHOTO.value:
+                input_args += ["-loop", "1", "-framerate", str(fps), "-t", str(duration), "-i", path]
+            else:
+                input_args += ["-ss", str(entry.start), "-t", str(duration), "-i", path]
+
+            chain = [
+                f"scale={target_w}:{target_h}:force_original_aspect_ratio=decrease",
+                f"pad={target_w}:{target_h}:(ow-iw)/2:(oh-ih)/2:color=black",
+                "setsar=1",
+                "format=yuv420p",
+                f"trim=duration={duration}",
+                "setpts=PTS-STARTPTS",
+                "settb=AVTB",
+                # Last, so xfade sees a constant frame rate: the chain above drops it from the stream
+                f"fps={fps}",
+            ]
+            if i > 0 and transitions[i - 1] in self.FADE_TRANSITIONS:
+                fade = self._transition_duration(durations[i - 1], duration)
+                chain.append(f"fade=t=in:st=0:d={fade}")
+            if i < len(timeline) - 1 and transitions[i] in self.FADE_TRANSITIONS:
+                fade = self._transition_duration(duration, durations[i + 1])
+                chain.append(f"fade=t=out:st={duration - fade}:d={fade}")
+            filters.append(f"[{i}:v]{','.join(chain)}[v{i}]")
+
+        # Join clips in order: xfade overlaps the clips, everything else is a plain concat
+        current = "[v0]"
+        total_duration = durations[0]
+        for i in range(1, len(timeline)):
+            output = f"[j{i}]" if i < len(timeline) - 1 else "[vout]"
+            xfade = self.XFADE_TRANSITIONS.get(transitions[i - 1])
+            overlap = self._xfade_duration(durations, transitions, i) if xfade is not None else 0
+            if overlap > 0:
+                offset = total_duration - overlap
+                filters.append(f"{current}[v{i}]xfade=transition={xfade}:duration={overlap}:offset={offset}{output}")
+                total_duration += durations[i] - overlap
+            else:
+                filters.append(f"{current}[v{i}]concat=n=2:v=1:a=0{output}")
+                total_duration += durations[i]
+            current = output
+        if len(timeline) == 1:
+            filters.append("[v0]null[vout]")
+
+        cmd = ["ffmpeg", "-hide_banner", "-y", *input_args]
+        output_args = ["-map", "[vout]"]
+        if audio_path:
+            cmd += ["-ss", str(audio_start), "-t", str(total_duration), "-i", audio_path]
+            output_args += ["-map", f"{len(timeline)}:a:0", *self.profile.audio_args()]
+        cmd += ["-filter_complex", ";".join(filters), *output_args]
+        cmd += [*self.profile.video_args(codec), "-movflags", "+faststart", output_path]
+        return cmd
+
+    def render(self, output_path, timeline: list[tuple[str, MediaClip]], audio_path="", audio_start=0):
+        if not audio_path:
+            self.logger.warning(
+                "No audio track selected, the clip audio is dropped: use the moviepy engine to keep it."
+            )
+        with tempfile.TemporaryDirectory(prefix="ffmpeg_render_") as work_dir:
+            # Photos go through the cached vertical formatting, exactly like the moviepy path
+            resolved = []
+            for i, (path, entry) in enumerate(timeline):
+                if entry.type == DataTypeEnum.PHOTO.value:
+                    frame_file = os.path.join(work_dir, f"photo_{i:03d}.png")
+                    Image.fromarray(np.asarray(self.video_preprocessing.load_vertical_photo(path))).save(frame_file)
+                    path = frame_file
+                resolved.append((path, entry))
+
+            cmd = self.build_command(resolved, output_path, get_codec(self.profile), audio_path, audio_start)
+            self.logger.info(f"Rendering with ffmpeg: {' '.join(cmd)}")
+            with span("ffmpeg_render", clips=len(timeline)):
+                subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+        self.logger.info(f"Rendered {output_path}")
@@ -0,0 +1,200 @@
+import json
+import logging
+import os
+import subprocess
+import threading
+from dataclasses import asdict
+from fractions import Fraction
+
+from utils.data_structures import MediaInfo
+from utils.media_cache import CACHE_ROOT
+from utils.tracing import span
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
+
+
+class ProbeIndex:
+    """On-disk JSON index of per-file probe results keyed by path, mtime and size, so it survives across runs."""
+
+    INDEX_FILE = None
+
+    def __init__(self, cache_root=CACHE_ROOT):
+        self.index_path = os.path.join(cache_root, self.INDEX_FILE)
+        self.logger = logging.getLogger(__name__)
+        self._index = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _index_key(path):
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}"
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(self.index_path) as f:
+                    self._index = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        temp_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}"
+        with open(temp_path, "w") as f:
+            json.dump(self._index, f)
+        os.replace(temp_path, self.index_path)
+
+    def _lookup(self, key):
+        with self._lock:
+            return self._load_index().get(key)
+
+    def _store(self, key, value):
+        with self._lock:
+            index = self._load_index()
+            # Drop entries for older versions of the same file
+            prefix = key.rsplit("|", 2)[0] + "|"
+            for stale in [k for k in index if k.startswith(prefix)]:
+                del index[stale]
+            index[key] = value
+            try:
+                self._save_index()
+            except OSError as e:
+                self.logger.warning(f"Failed to save {self.INDEX_FILE}: {e}")
+
+
+class MediaProbe(ProbeIndex):
+    """
+    Single-pass ffprobe wrapper. Every file is probed once with a JSON ffprobe call and the result is
+    memoized in the on-disk probe index.
+    """
+
+    INDEX_FILE = "probe_index.json"
+
+    @staticmethod
+    def _parse_rate(rate) -> float:
+        try:
+            return float(Fraction(rate))
+        except (TypeError, ValueError, ZeroDivisionError):
+            return 0.0
+
+    @staticmethod
+    def _parse_rotation(stream) -> int:
+        rotation = stream.get("tags", {}).get("rotate")
+        if rotation is None:
+            for side_data in stream.get("side_data_list", []):
+                if "rotation" in side_data:
+                    rotation = side_data["rotation"]
+                    break
+        return int(float(rotation)) % 360 if rotation is not None else 0
+
+    @classmethod
+    def parse(cls, probe_output: dict) -> MediaInfo:
+        streams = probe_output.get("streams", [])
+        video = next((s for s in streams if s.get("codec_type") == "video"), {})
+        audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+        duration = probe_output.get("format", {}).get("duration", video.get("duration", 0))
+        return MediaInfo(
+            duration=float(duration or 0),
+            width=int(video.get("width", 0)),
+            height=int(video.get("height", 0)),
+            r_fps=cls._parse_rate(video.get("r_frame_rate")),
+            avg_fps=cls._parse_rate(video.get("avg_frame_rate")),
+            rotation=cls._parse_rotation(video),
+            video_codec=video.get("codec_name"),
+            pix_fmt=video.get("pix_fmt"),
+            audio_codec=audio.get("codec_name") if audio else None,
+            video_profile=video.get("profile"),
+            video_level=video["level"] if video.get("level", -99) > 0 else None,
+            has_b_frames=video.get("has_b_frames"),
+        )
+
+    def probe(self, path) -> MediaInfo | None:
+        try:
+            key = self._index_key(path)
+        except OSError as e:
+            self.logger.error(f"ffprobe failed on {path}: {e}")
+            return None
+
+        cached = self._lookup(key)
+        if cached is not None:
+            try:
+                return MediaInfo(**cached)
+            except TypeError:
+                self.logger.warning(f"Stale probe index entry for {path}, probing again")
+
+        cmd = ["ffprobe", "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path]
+        try:
+            with span("ffprobe", file=path):
+                output = subprocess.check_output(cmd, stderr=subprocess.DEVNULL)
+            info = self.parse(json.loads(output))
+        except Exception as e:
+            self.logger.error(f"ffprobe failed on {path}: {e}")
+            return None
+
+        self._store(key, asdict(info))
+        return info
+
+
+class KeyframeIndex(ProbeIndex):
+    """
+    Keyframe times of the first video stream, in seconds from the start of the file, read from packet flags
+    without decoding and memoized in an on-disk index.
+    """
+
+    INDEX_FILE = "keyframe_index.json"
+
+    @staticmethod
+    def parse(probe_output: dict) -> list[float]:
+        start_time = float(probe_output.get("format", {}).get("start_time", 0) or 0)
+        keyframes = set()
+        for packet in probe_output.get("packets", []):
+            if "K" in packet.get("flags", "") and packet.get("pts_time", "N/A") != "N/A":
+                keyframes.add(round(float(packet["pts_time"]) - start_time, 6))
+        return sorted(keyframes)
+
+    def keyframes(self, path) -> list[float] | None:
+        try:
+            key = self._index_key(path)
+        except OSError as e:
+            self.logger.error(f"Keyframe probe failed on {path}: {e}")
+            return None
+
+        cached = self._lookup(key)
+        if isinstance(cached, list):
+            return cached
+
+        cmd = [
+            "ffprobe",
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "packet=pts_time,flags:format=start_time",
+            "-print_format",
+            "json",
+            path,
+        ]
+        try:
+            with span("keyframe_probe", file=path):
+                output = subprocess.check_output(cmd, stderr=subprocess.DEVNULL)
+            keyframes = self.parse(json.loads(output))
+        except Exception as e:
+            self.logger.error(f"Keyframe probe failed on {path}: {e}")
+            return None
+
+        self._store(key, keyframes)
+        return keyframes
+
+
+_default_probe = MediaProbe()
+_default_keyframe_index = KeyframeIndex()
+
+
+def probe_media(path) -> MediaInfo | None:
+    return _default_probe.probe(path)
+
+
+def probe_keyframes(path) -> list[float] | None:
+    return _default_keyframe_index.keyframes(path)
@@ -1,9 +1,9 @@
 import os
 import sys
-import time
+import threading
 
 import vlc
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QPalette
 from PyQt5.QtWidgets import (
     QFileDialog,
@@ -16,12 +16,23 @@ from PyQt5.QtWidgets import (
 )
 
 from components.video_processing.fast_video_concat import FFmpegConcat
-from utils.data_structures import Segment
+from components.video_processing.media_probe import probe_media
+from components.video_processing.proxy_media import ProxyMedia
+from utils.data_structures import (
+    RENDER_PROFILES,
+    RenderProfile,
+    RenderProfileEnum,
+    Segment,
+)
 
 
 class VideoPlayerUI(QWidget):
+    preview_ready = pyqtSignal(object, str, float)
+
     def __init__(self):
         super().__init__()
+        self.preview_job = None  # FFmpegConcat of the fast preview being built
+        self.preview_ready.connect(self._play_preview)
         self.segments = None
         self.total_duration = None
         self.current_segment_index = 0
@@ -101,27 +112,13 @@ class VideoPlayerUI(QWidget):
         self.player.set_media(media)
         self.current_segment_index = index
 
-    def _get_media_duration(self, file_path, timeout=5):
-        instance = vlc.Instance("--quiet")
-        media = instance.media_new(file_path)
-
-        # Start parsing
-        media.parse_with_options(vlc.MediaParseFlag.local, timeout=0)
-
-        # Wait for media to be parsed or timeout
-        start_time = time.time()
-        while not media.is_parsed():
-            if time.time() - start_time > timeout:
-                print("Timeout while parsing media.")
-                return 0
-            time.sleep(0.1)
-
-        duration_ms = media.get_duration()
-        if duration_ms <= 0:
+    @staticmethod
+    def _get_media_duration(file_path):
+        info = probe_media(file_path)
+        if info is None or info.duration <= 0:
             print("Duration not available or invalid.")
             return 0
-
-        return duration_ms / 1000.0  # seconds
+        return info.duration
 
     def open_video_file(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Open Video File", "", "Video Files (*.mp4 *.mov *.avi *.mkv)")
@@ -141,20 +138,46 @@ class VideoPlayerUI(QWidget):
         audio_segments: None | list[Segment] = None,
         text_segments: None | list[Segment] = None,
         output_folder: str = "",
+        proxy_media: ProxyMedia = None,
+        profile: RenderProfile = RENDER_PROFILES[RenderProfileEnum.PREVIEW],
+        smart_cut: bool = False,
     ):
+        """Build the preview in the background and play it when ready. A preview still being built is aborted."""
         if video_segments is not None and len(video_segments) != 0:
             os.makedirs(output_folder, exist_ok=True)
             output_file = os.path.join(output_folder, "fast_preview.mp4")
-            _, self.total_duration = FFmpegConcat().concat_segments(video_segments, output_file, audio_segments)
-            self.segments = [
-                {
-                    "path": output_file,
-                    "start": 0.0,
-                    "end": self.total_duration,
-                }
-            ]
-            self.stop()
-            self.play()
+            self.cancel_preview()
+            self.preview_job = FFmpegConcat(proxy_media, profile, smart_cut=smart_cut)
+            threading.Thread(
+                target=self._build_preview,
+                args=(self.preview_job, video_segments, output_file, audio_segments),
+                daemon=True,
+            ).start()
+
+    def _build_preview(self, job: FFmpegConcat, video_segments, output_file, audio_segments):
+        success, duration = job.concat_segments(video_segments, output_file, audio_segments)
+        if success:
+            self.preview_ready.emit(job, output_file, duration)
+
+    def _play_preview(self, job: FFmpegConcat, output_file, duration):
+        if job is not self.preview_job:
+            return  # superseded by a newer preview
+        self.preview_job = None
+        self.total_duration = duration
+        self.segments = [
+            {
+                "path": output_file,
+                "start": 0.0,
+                "end": self.total_duration,
+            }
+        ]
+        self.stop()
+        self.play()
+
+    def cancel_preview(self):
+        if self.preview_job is not None:
+            self.preview_job.cancel()
+            self.preview_job = None
 
     def play(self):
         if self.segments is not None and self.total_duration is not None:
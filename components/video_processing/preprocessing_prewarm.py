@@ -0,0 +1,54 @@
+import logging
+
+from components.video_processing.video_preprocessing import VideoPreprocessing
+from components.video_processing.video_processing_utils import BackgroundPool
+from utils.data_structures import (
+    RENDER_PROFILES,
+    DataTypeEnum,
+    MediaClip,
+    RenderProfile,
+    RenderProfileEnum,
+)
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
+
+
+class PreprocessingPrewarmer:
+    """
+    Background pre-warm of probes, CFR conversions and photo formatting for a loaded timeline config.
+    Work runs on a small pool at lowered priority and lands in the shared caches, where
+    create_instagram_reel picks it up. Starting a new pre-warm cancels the previous one.
+    """
+
+    MAX_WORKERS = 2
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.logger = logging.getLogger(__name__)
+        self._pool = BackgroundPool("prewarm", max_workers)
+
+    def start(
+        self,
+        config: dict[str, MediaClip],
+        media_dir,
+        profile: RenderProfile = RENDER_PROFILES[RenderProfileEnum.FINAL],
+    ):
+        """Pre-warm for renders with profile: CFR intermediates are keyed by its encoder settings."""
+        jobs = [
+            (file_path, entry, media_dir)
+            for file_path, entry in config.items()
+            if entry.type in (DataTypeEnum.VIDEO, DataTypeEnum.PHOTO)
+        ]
+        video_preprocessing = VideoPreprocessing(profile=profile, low_priority=True)
+        self._pool.start(video_preprocessing.prewarm_entry, jobs, on_cancel=video_preprocessing.terminate_processes)
+        if jobs:
+            self.logger.info(f"Pre-warming {len(jobs)} timeline entries in background.")
+
+    def cancel(self):
+        """Drop pending entries and kill transcodes that are still running."""
+        self._pool.cancel()
+
+    def is_running(self) -> bool:
+        return self._pool.is_running()
+
+    def wait(self, timeout=None):
+        self._pool.wait(timeout)
@@ -0,0 +1,108 @@
+import logging
+
+from components.video_processing.video_processing_utils import (
+    BackgroundPool,
+    CommandRunner,
+)
+from utils.media_cache import CACHE_ROOT, DiskCache, cache_key, file_fingerprint
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
+
+
+class ProxyMedia:
+    """
+    Low resolution, short GOP, CFR proxies of video sources for previews, generated once in the background
+    and kept in a shared disk cache. Proxies keep the source timestamps, so preview paths can swap them in
+    for the originals as soon as they are ready; final renders keep decoding the originals.
+    """
+
+    PROXY_CACHE = "proxies"
+    PROXY_CACHE_MAX_BYTES = 10 * 1024**3
+    PROXY_MAX_SIZE = 720  # longest side, in pixels
+    PROXY_FPS = 30
+    PROXY_GOP = 15  # frames between keyframes, keeps seeks and trims cheap
+    MAX_WORKERS = 2
+
+    def __init__(self, cache_root=CACHE_ROOT, max_workers=MAX_WORKERS):
+        self.cache = DiskCache(self.PROXY_CACHE, self.PROXY_CACHE_MAX_BYTES, cache_root)
+        self.logger = logging.getLogger(__name__)
+        self._pool = BackgroundPool("proxy", max_workers)
+
+    def encode_args(self) -> list[str]:
+        size = self.PROXY_MAX_SIZE
+        return [
+            "-vf",
+            f"scale='min({size},iw)':'min({size},ih)':force_original_aspect_ratio=decrease:force_divisible_by=2",
+            "-r",
+            str(self.PROXY_FPS),
+            "-vsync",
+            "cfr",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "veryfast",
+            "-tune",
+            "fastdecode",
+            "-crf",
+            "23",
+            "-g",
+            str(self.PROXY_GOP),
+            "-keyint_min",
+            str(self.PROXY_GOP),
+            "-sc_threshold",
+            "0",
+            "-pix_fmt",
+            "yuv420p",
+            "-an",
+        ]
+
+    def _key(self, source_path):
+        return cache_key(file_fingerprint(source_path), self.encode_args())
+
+    def get(self, source_path) -> str | None:
+        """Path of the ready proxy of source_path, or None if it was not generated (yet)."""
+        try:
+            return self.cache.get(self._key(source_path), ".mp4")
+        except OSError:
+            return None
+
+    def resolve(self, source_path) -> str:
+        """The proxy when it is ready, the original otherwise."""
+        return self.get(source_path) or source_path
+
+    def generate(self, source_path, command_runner: CommandRunner = None) -> str:
+        """Generate the proxy of source_path unless it is cached. Returns the proxy path."""
+        command_runner = command_runner or CommandRunner()
+        key = self._key(source_path)
+        with self.cache.lock(key):
+            cached_path = self.cache.get(key, ".mp4")
+            if cached_path is not None:
+                return cached_path
+            temp_path = self.cache.temp_path_for(key, ".mp4")
+            cmd = ["ffmpeg", "-hide_banner", "-y", "-i", source_path, *self.encode_args(), temp_path]
+            try:
+                command_runner.run(cmd)
+            except Exception:
+                self.cache.discard(temp_path)
+                raise
+            proxy_path = self.cache.commit(temp_path, key, ".mp4")
+        self.logger.info(f"Generated preview proxy for {source_path}: {proxy_path}")
+        return proxy_path
+
+    def start(self, source_paths: list[str]):
+        """Generate the proxies of source_paths on a small low priority pool, cancelling a previous run."""
+        command_runner = CommandRunner(low_priority=True)
+        jobs = [(path, command_runner) for path in dict.fromkeys(source_paths)]
+        self._pool.start(self.generate, jobs, on_cancel=command_runner.terminate)
+        if jobs:
+            self.logger.info(f"Generating {len(jobs)} preview proxies in background.")
+
+    def cancel(self):
+        """Drop pending proxies and kill encodes that are still running."""
+        self._pool.cancel()
+
+    def is_running(self) -> bool:
+        return self._pool.is_running()
+
+    def wait(self, timeout=None):
+        self._pool.wait(timeout)
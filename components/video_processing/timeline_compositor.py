@@ -0,0 +1,71 @@
+import logging
+
+from moviepy import concatenate_videoclips
+from moviepy.video.fx.CrossFadeIn import CrossFadeIn
+from moviepy.video.fx.CrossFadeOut import CrossFadeOut
+from moviepy.video.fx.FadeIn import FadeIn
+from moviepy.video.fx.FadeOut import FadeOut
+
+from components.video_processing.video_transitions import VideoTransitions
+from utils.data_structures import FPS, LoadedVideo, TransitionTypeEnum
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
+
+
+class TimelineCompositor:
+    """
+    Composes a whole timeline in one ordered pass. Every clip is split into the part shown on its own and the
+    windows shared with its neighbours, and all pieces are concatenated once, so each source frame is decoded
+    and blended at most once instead of re-rendering the growing result at every transition.
+    """
+
+    TRANSITION_DURATION = 1
+    FADE_IN = {TransitionTypeEnum.FADE: FadeIn, TransitionTypeEnum.CROSS_FADE: CrossFadeIn}
+    FADE_OUT = {TransitionTypeEnum.FADE: FadeOut, TransitionTypeEnum.CROSS_FADE: CrossFadeOut}
+
+    def __init__(self, video_transitions: VideoTransitions = None, fps=FPS, transition_duration=TRANSITION_DURATION):
+        self.video_transitions = video_transitions or VideoTransitions()
+        self.fps = fps
+        self.transition_duration = transition_duration
+
+    def compose(self, clips: list[LoadedVideo]):
+        # Transition i joins clips[i] and clips[i + 1]; the transition of the last clip is unused
+        transitions = [clip.transition for clip in clips[:-1]]
+        sources = [clip.clip for clip in clips]
+
+        for i, transition in enumerate(transitions):
+            if transition in self.FADE_OUT:
+                sources[i] = self.FADE_OUT[transition](duration=self.transition_duration).apply(sources[i])
+                sources[i + 1] = self.FADE_IN[transition](duration=self.transition_duration).apply(sources[i + 1])
+
+        blended = [transition in self.video_transitions.blend_frames for transition in transitions]
+        windows = []
+        for i, transition in enumerate(transitions):
+            window = None
+            if blended[i]:
+                # A clip with windows on both sides gives each at most half of its length, so they never overlap
+                limit1 = sources[i].duration / 2 if i > 0 and blended[i - 1] else sources[i].duration
+                limit2 = (
+                    sources[i + 1].duration / 2 if i + 1 < len(blended) and blended[i + 1] else sources[i + 1].duration
+                )
+                window = self.video_transitions.transition_window(
+                    sources[i],
+                    sources[i + 1],
+                    min(self.transition_duration, limit1, limit2),
+                    self.fps,
+                    self.video_transitions.blend_frames[transition],
+                )
+            windows.append(window)
+
+        pieces = []
+        for i, source in enumerate(sources):
+            head = windows[i - 1].duration if i > 0 and windows[i - 1] is not None else 0
+            tail = windows[i].duration if i < len(windows) and windows[i] is not None else 0
+            if source.duration - head - tail > 0:
+                pieces.append(source.subclipped(head, source.duration - tail))
+            if tail:
+                pieces.append(windows[i])
+
+        if len(pieces) == 1:
+            return pieces[0]
+        return concatenate_videoclips(pieces, method="compose")
@@ -0,0 +1,145 @@
+import threading
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+from utils.data_structures import TransitionTypeEnum
+
+WARP_PLAN_CACHE_SIZE = 32
+
+
+class FrameBuffers:
+    """Named per-thread frame buffers, reallocated only when the frame shape changes."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def get(self, name, shape, dtype=np.uint8):
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buffer = buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = buffers[name] = np.empty(shape, dtype)
+        return buffer
+
+
+def as_uint8(frame):
+    """The frame as uint8. Fade effects hand out float frames, clipped and cast like moviepy does on write."""
+    if frame.dtype == np.uint8:
+        return frame
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def blend_into(frame1, frame2, progress, dst):
+    """dst = frame1 * (1 - progress) + frame2 * progress, using cv2's saturating weighted add without temporaries."""
+    return cv2.addWeighted(frame1, 1 - progress, frame2, progress, 0, dst=dst)
+
+
+def zoom_scales(progress, direction):
+    # Determine zoom scale based on direction
+    if direction == "in_out":
+        return 1.2 - 0.2 * progress, 0.8 + 0.2 * progress  # zoom out, zoom in
+    elif direction == "out_in":
+        return 0.8 + 0.2 * progress, 1.2 - 0.2 * progress  # zoom in, zoom out
+    elif direction == "in":
+        return 1.0 + 0.2 * progress, 1.0 + 0.2 * progress
+    elif direction == "out":
+        return 1.2 - 0.2 * progress, 1.2 - 0.2 * progress
+    raise ValueError("Invalid direction. Use 'in_out', 'out_in', 'in', or 'out'.")
+
+
+@lru_cache(maxsize=WARP_PLAN_CACHE_SIZE)
+def get_warp_plan(transition, size, transition_frames, direction="in_out") -> np.ndarray:
+    """
+    Affine warps of both clips for every step of a spin or zoom transition, shape (steps, 2, 2, 3).
+    The geometry depends only on frame size, step count and direction, so all transitions of a reel
+    sharing them reuse one plan. Each frame is then a single warpAffine pass, which is faster than cv2.remap
+    with precomputed tables and avoids ~12 MB of map data per step at 1080x1920.
+    """
+    w, h = size
+    plan = np.empty((transition_frames, 2, 2, 3))
+    for i in range(transition_frames):
+        progress = i / transition_frames
+        if transition == TransitionTypeEnum.SPIN:
+            # Rotate a frame around its center
+            center = (w // 2, h // 2)
+            plan[i, 0] = cv2.getRotationMatrix2D(center, 360 * progress, 1.0)
+            plan[i, 1] = cv2.getRotationMatrix2D(center, -360 + 360 * progress, 1.0)
+        elif transition == TransitionTypeEnum.ZOOM:
+            # Zoom in/out around the center, cropping or padding to keep the frame size
+            scale1, scale2 = zoom_scales(progress, direction)
+            plan[i, 0] = cv2.getRotationMatrix2D((w / 2, h / 2), 0, scale1)
+            plan[i, 1] = cv2.getRotationMatrix2D((w / 2, h / 2), 0, scale2)
+        else:
+            raise ValueError(f"No warp plan for transition: {transition}")
+    plan.flags.writeable = False
+    return plan
+
+
+def warp_into(frame, matrix, dst):
+    h, w = dst.shape[:2]
+    return cv2.warpAffine(
+        frame,
+        matrix,
+        (w, h),
+        dst=dst,
+        flags=cv2.INTER_LINEAR,
+        borderMode=cv2.BORDER_CONSTANT,
+        borderValue=0,
+    )
+
+
+class SlideKernel:
+    """
+    Vectorized slide transition. Column offsets and seam alpha ramps for every transition frame are computed
+    once, and each frame is assembled with a few array operations into a reusable output buffer
+    (one buffer per thread), so wider seams no longer cost a Python loop per column.
+    """
+
+    def __init__(self, width, transition_frames, blend_width=0):
+        self.width = width
+        self.transition_frames = transition_frames
+        self.blend_width = blend_width
+        progress = np.arange(transition_frames) / transition_frames
+        self.x_offsets = (width * (1 - progress)).astype(int)
+
+        # Seam columns blended at each step: col2 shows frame1[:, col1] mixed with frame2[:, col2]
+        ramp = np.arange(blend_width)
+        alpha = ramp / blend_width if blend_width else ramp.astype(float)
+        self.seams = []
+        for x_offset in self.x_offsets:
+            cols1 = width - x_offset + ramp
+            cols2 = x_offset - blend_width + ramp
+            valid = (cols1 >= 0) & (cols1 < width) & (cols2 >= 0) & (cols2 < width)
+            if not 0 < x_offset < width:
+                valid[:] = False
+            self.seams.append((cols1[valid], cols2[valid], alpha[valid][:, None]))
+        self.buffers = FrameBuffers()
+
+    def render(self, i, frame1, frame2):
+        """Frame ``i`` of the transition. The returned array is reused by the next call on this thread."""
+        w = self.width
+        x_offset = self.x_offsets[i]
+        left = x_offset - self.blend_width
+        right = x_offset + self.blend_width
+        frame = self.buffers.get("slide", frame1.shape, frame1.dtype)
+
+        # Slide clip1 out left, clip2 in right, black in between
+        if left > 0:
+            frame[:, :left] = frame1[:, w - left :]
+        if right < w:
+            frame[:, right:] = frame2[:, : w - right]
+        frame[:, max(left, 0) : min(right, w)] = 0
+
+        # Blend seam area with linear alpha
+        cols1, cols2, alpha = self.seams[i]
+        if len(cols2):
+            frame[:, cols2] = (frame1[:, cols1] * (1 - alpha) + frame2[:, cols2] * alpha).astype(np.uint8)
+        return frame
+
+
+@lru_cache(maxsize=16)
+def get_slide_kernel(width, transition_frames, blend_width=0) -> SlideKernel:
+    return SlideKernel(width, transition_frames, blend_width)
@@ -1,103 +1,92 @@
 import logging
+import multiprocessing
 import os
 import shutil
+import subprocess
+import tempfile
 import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
 
-from moviepy import AudioFileClip, VideoFileClip, concatenate_videoclips
-from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
-from moviepy.video.VideoClip import ColorClip
+import numpy as np
+from moviepy import AudioFileClip
+from PIL import Image
 from tqdm import tqdm
 
-from components.video_processing.video_processing_utils import get_codec
+from components.video_processing.timeline_compositor import TimelineCompositor
+from components.video_processing.video_preprocessing import VideoPreprocessing
+from components.video_processing.video_processing_utils import (
+    LetterboxTransform,
+    concat_video_parts,
+    get_codec,
+)
 from components.video_processing.video_transitions import VideoTransitions
-from utils.data_structures import LoadedVideo
+from utils.data_structures import (
+    INSTAGRAM_RESOLUTION,
+    RENDER_PROFILES,
+    LoadedVideo,
+    RenderProfile,
+    RenderProfileEnum,
+    TransitionTypeEnum,
+)
+from utils.tracing import in_trace_context, span
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
 
 
 class VideoPostProcessing:
-    OUTPUT_FPS = 30
     PREVIEW_FOLDER = "preview"
     PREVIEW_FILE_TEMPLATE = "{index}_preview.mp4"
 
-    def __init__(self):
+    def __init__(self, profile: RenderProfile = RENDER_PROFILES[RenderProfileEnum.FINAL]):
         self.logger = logging.getLogger(__name__)
+        self.profile = profile
         self.video_transitions = VideoTransitions()
+        self.compositor = TimelineCompositor(self.video_transitions, fps=self.profile.fps)
 
     @staticmethod
-    def resize_and_center(clip: LoadedVideo, target_size=(1080, 1920)) -> LoadedVideo:
-        target_w, target_h = target_size
-        clip_w, clip_h = clip.clip.size
-        clip_ar = clip_w / clip_h
-        target_ar = target_w / target_h
-
-        # Determine new size to preserve aspect ratio
-        if clip_ar > target_ar:
-            # Too wide, match width and scale height
-            new_w = target_w
-            new_h = int(target_w / clip_ar)
-        else:
-            # Too tall, match height and scale width
-            new_h = target_h
-            new_w = int(target_h * clip_ar)
-
-        # Now actually resize the clip
-        resized_clip = clip.clip.resized(new_size=(new_w, new_h))
-
-        # Create a background (black)
-        background = ColorClip(
-            size=target_size,
-            color=(
-                0,
-                0,
-                0,
-            ),
-            duration=clip.clip.duration,
-        )
-
-        # Overlay the resized clip in the center of the background
-        composed = CompositeVideoClip(
-            [background, resized_clip.with_position("center")],
-            size=target_size,
-        )
-        clip.clip = composed.with_duration(clip.clip.duration).with_audio(resized_clip.audio)
+    def resize_and_center(clip: LoadedVideo, target_size=INSTAGRAM_RESOLUTION) -> LoadedVideo:
+        # Sources already at the reel size (formatted photos, CFR conversions of vertical videos) pass through
+        if tuple(clip.clip.size) == tuple(target_size):
+            return clip
+        letterbox = LetterboxTransform(clip.clip.size, target_size)
+        # The black canvas replaces any transparency, like the old composite over a black background did
+        clip.clip = clip.clip.without_mask().image_transform(letterbox)
         return clip
 
     def apply_transitions(self, clips: list[LoadedVideo]):
-        final_clip = clips[0].clip
+        return self.compositor.compose(clips)
 
-        for i in range(1, len(clips)):
-            transition = self.video_transitions.transitions[clips[i - 1].transition]
-            final_clip = transition(final_clip, clips[i].clip, duration=1)
-        return final_clip
+    def preview_file(self, index):
+        return os.path.join(self.PREVIEW_FOLDER, self.PREVIEW_FILE_TEMPLATE.format(index=f"0{index}"))
 
-    def render_clip(self, index, clip, codec, fps):
-        output_file = os.path.join(self.PREVIEW_FOLDER, self.PREVIEW_FILE_TEMPLATE.format(index=f"0{index}"))
-        clip.write_videofile(
-            output_file,
-            codec=codec,
-            audio_codec="aac",
-            threads=max(1, os.cpu_count() - 2),
-            fps=fps,
-            logger=None,  # bar
-            preset="ultrafast",
-        )
+    def render_clip(self, index, clip, codec):
+        # Every part is encoded with the same video settings and no audio, so the parts join by stream copy
+        with span("encode", part=index):
+            clip.write_videofile(
+                self.preview_file(index),
+                audio=False,
+                logger=None,  # bar
+                **self.profile.write_videofile_kwargs(codec),
+            )
         clip.close()
 
     def preview(self, clips: list[LoadedVideo], audio_path="", audio_start=0):
         if os.path.exists(self.PREVIEW_FOLDER):
             shutil.rmtree(self.PREVIEW_FOLDER)
         os.makedirs(self.PREVIEW_FOLDER, exist_ok=True)
-        codec = get_codec()
+        codec = get_codec(self.profile)
         threads = []
+        duration = 0
 
         # TODO:
         # use ProcessPool
         for index, c in enumerate(clips, 1):
-            resized_clip = self.resize_and_center(c).clip
+            resized_clip = self.resize_and_center(c, self.profile.resolution).clip
+            duration += resized_clip.duration
             thread = threading.Thread(
-                target=self.render_clip,
-                args=(index, resized_clip, codec, self.OUTPUT_FPS),
+                target=in_trace_context(self.render_clip),
+                args=(index, resized_clip, codec),
             )
             thread.start()
             threads.append(thread)
@@ -106,52 +95,196 @@ class VideoPostProcessing:
         for thread in tqdm(threads, desc="Rendering previews"):
             thread.join()
 
-        files = sorted(f for f in os.listdir(self.PREVIEW_FOLDER) if "preview" in f and f.endswith(".mp4"))
-        files.sort(key=lambda x: int(x.split("_")[0]))
-        if not files:
-            raise Exception("No preview_*.mp4 files found!")
-
-        clips = [VideoFileClip(os.path.join(self.PREVIEW_FOLDER, f)) for f in files]
+        files = [self.preview_file(index) for index in range(1, len(clips) + 1)]
+        missing = [f for f in files if not os.path.exists(f)]
+        if missing:
+            raise Exception(f"Preview parts were not rendered: {missing}")
 
-        # === Concatenate videos ===
-        final_video = concatenate_videoclips(clips, method="compose")
-        # === Load and attach audio ===
-        audio = AudioFileClip(audio_path).subclipped(
-            start_time=audio_start, end_time=audio_start + final_video.duration
-        )
-        final_video = final_video.with_audio(audio)
-
-        # === Export ===
-        final_video.write_videofile(
+        # Join the parts without re-encoding and mux in the audio trimmed to the preview duration
+        concat_video_parts(
+            files,
             os.path.join(self.PREVIEW_FOLDER, "preview_fast.mp4"),
-            codec=codec,
-            audio_codec="aac",
-            fps=self.OUTPUT_FPS,
-            preset="ultrafast",
+            audio_path,
+            audio_start,
+            duration,
         )
 
-        # === Cleanup ===
+    @staticmethod
+    def is_still_clip(clips: list[LoadedVideo], index) -> bool:
+        """A photo clip without a transition on either side can be encoded as a single held frame."""
+        clip = clips[index]
+        if clip.still_frame is None:
+            return False
+        if index > 0 and clips[index - 1].transition != TransitionTypeEnum.NONE:
+            return False
+        return index == len(clips) - 1 or clip.transition == TransitionTypeEnum.NONE
+
+    def render_still_segment(self, frame, duration, output_file, codec):
+        """Encode a held frame once as a looped input instead of compositing every output frame in Python."""
+        frame_file = f"{output_file}.png"
+        Image.fromarray(np.asarray(frame)).save(frame_file)
+        cmd = [
+            "ffmpeg",
+            "-hide_banner",
+            "-y",
+            "-loop",
+            "1",
+            "-framerate",
+            str(self.profile.fps),
+            "-i",
+            frame_file,
+            "-t",
+            str(duration),
+            "-vf",
+            "scale={}:{}".format(*self.profile.resolution),
+            *self.profile.video_args(codec),
+            "-an",
+            output_file,
+        ]
+        try:
+            with span("encode_still", duration=duration):
+                subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+        finally:
+            os.remove(frame_file)
+
+    def _final_render_segmented(self, output_path, clips: list[LoadedVideo], audio_path, audio_start, codec):
+        """
+        Render still photos with ffmpeg and the remaining runs of clips with moviepy, using the same encoder
+        settings, then join all parts by stream copy and mux the audio once.
+        """
+        with tempfile.TemporaryDirectory(prefix="final_render_") as work_dir:
+            part_files = []
+            duration = 0
+            run = []
+
+            def flush_run():
+                nonlocal duration
+                if not run:
+                    return
+                part_file = os.path.join(work_dir, f"part_{len(part_files):03d}.mp4")
+                run_clip = self.apply_transitions([self.resize_and_center(c, self.profile.resolution) for c in run])
+                with span("encode", part=len(part_files)):
+                    run_clip.write_videofile(
+                        part_file, audio=False, logger=None, **self.profile.write_videofile_kwargs(codec)
+                    )
+                duration += run_clip.duration
+                run_clip.close()
+                part_files.append(part_file)
+                run.clear()
+
+            for index, clip in enumerate(clips):
+                if not self.is_still_clip(clips, index):
+                    run.append(clip)
+                    continue
+                flush_run()
+                part_file = os.path.join(work_dir, f"part_{len(part_files):03d}.mp4")
+                self.render_still_segment(clip.still_frame, clip.clip.duration, part_file, codec)
+                duration += clip.clip.duration
+                part_files.append(part_file)
+            flush_run()
+
+            concat_video_parts(part_files, output_path, audio_path, audio_start, duration)
+        logging.info(f"Clip duration: {duration}")
+
+    @staticmethod
+    def split_chunks(clips: list[LoadedVideo]) -> list[list[LoadedVideo]]:
+        """Split the timeline after every clip joined to the next one without a transition."""
+        chunks = [[]]
         for clip in clips:
-            clip.close()
-        audio.close()
-        final_video.close()
+            chunks[-1].append(clip)
+            if clip.transition == TransitionTypeEnum.NONE:
+                chunks.append([])
+        return [chunk for chunk in chunks if chunk]
+
+    def _final_render_chunked(self, output_path, chunks, audio_path, audio_start, codec, chunk_workers):
+        """
+        Render independent chunks of the timeline in a process pool, each worker composing and encoding its own
+        chunk with the same encoder settings, then join the parts by stream copy and mux the audio once.
+        """
+        # Each worker encodes with its share of the cores
+        profile = replace(self.profile, threads=max(1, (os.cpu_count() or 1) // chunk_workers))
+        # spawn, so workers do not inherit decoder threads (or a Qt application) from this process
+        context = multiprocessing.get_context("spawn")
+        with tempfile.TemporaryDirectory(prefix="final_render_") as work_dir:
+            part_files = [os.path.join(work_dir, f"part_{i:03d}.mp4") for i in range(len(chunks))]
+            with (
+                span("render_chunks", chunks=len(chunks), workers=chunk_workers),
+                ProcessPoolExecutor(max_workers=min(chunk_workers, len(chunks)), mp_context=context) as executor,
+            ):
+                durations = list(
+                    executor.map(
+                        render_chunk,
+                        [[clip.source for clip in chunk] for chunk in chunks],
+                        part_files,
+                        [codec] * len(chunks),
+                        [profile] * len(chunks),
+                    )
+                )
+            duration = sum(durations)
+            concat_video_parts(part_files, output_path, audio_path, audio_start, duration)
+        logging.info(f"Clip duration: {duration}")
+
+    def final_render(
+        self,
+        output_path: str,
+        clips: list[LoadedVideo],
+        audio_path: str = "",
+        audio_start=0,
+        chunk_workers=1,
+    ):
+        codec = get_codec(self.profile)
+        # Chunks are rebuilt from their sources in the workers; parts carry no audio, so audio_path is required
+        chunks = self.split_chunks(clips)
+        if chunk_workers > 1 and audio_path and len(chunks) > 1 and all(clip.source for clip in clips):
+            self._final_render_chunked(output_path, chunks, audio_path, audio_start, codec, chunk_workers)
+            for clip in clips:
+                clip.clip.close()
+            return
+
+        # Still segments carry no audio, so the fast path is used when the reel gets its audio from audio_path
+        if audio_path and any(self.is_still_clip(clips, i) for i in range(len(clips))):
+            self._final_render_segmented(output_path, clips, audio_path, audio_start, codec)
+            for clip in clips:
+                clip.clip.close()
+            return
 
-    def final_render(self, output_path: str, clips: list[LoadedVideo], audio_path: str = "", audio_start=0):
-        resized_clips_list = [self.resize_and_center(c) for c in clips]
+        resized_clips_list = [self.resize_and_center(c, self.profile.resolution) for c in clips]
         final_clip = self.apply_transitions(resized_clips_list)
 
         if audio_path:
             audio_clip = AudioFileClip(audio_path).subclipped(audio_start, audio_start + final_clip.duration)
             final_clip = final_clip.with_audio(audio_clip)
-        final_clip.write_videofile(
-            output_path,
-            codec=get_codec(),
-            audio_codec="aac",
-            threads=os.cpu_count() - 2,
-            fps=self.OUTPUT_FPS,
-        )
+        with span("encode"):
+            final_clip.write_videofile(output_path, **self.profile.write_videofile_kwargs(codec))
         logging.info(f"Clip duration: {final_clip.duration}")
         # Close all clips to release resources
         final_clip.close()
         for clip in clips:
             clip.clip.close()
+
+
+def render_chunk(sources, output_file, codec, profile: RenderProfile = RENDER_PROFILES[RenderProfileEnum.FINAL]):
+    """
+    Process pool worker: reload a chunk of the timeline from its (file_path, entry, media_dir) sources,
+    which hits the CFR and photo caches filled by the parent, and encode it without audio.
+    Returns the duration of the encoded chunk.
+    """
+    video_preprocessing = VideoPreprocessing(profile=profile)
+    video_postprocessing = VideoPostProcessing(profile)
+    clips = [video_preprocessing.process_entry(*source) for source in sources]
+    try:
+        if len(clips) == 1 and clips[0].still_frame is not None:
+            duration = clips[0].clip.duration
+            video_postprocessing.render_still_segment(clips[0].still_frame, duration, output_file, codec)
+            return duration
+
+        chunk_clip = video_postprocessing.apply_transitions(
+            [video_postprocessing.resize_and_center(c, profile.resolution) for c in clips]
+        )
+        chunk_clip.write_videofile(output_file, audio=False, logger=None, **profile.write_videofile_kwargs(codec))
+        duration = chunk_clip.duration
+        chunk_clip.close()
+        return duration
+    finally:
+        for clip in clips:
+            clip.clip.close()
@@ -1,63 +1,121 @@
 import logging
+import math
 import os
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 from moviepy import ImageClip, VideoFileClip
-from sympy import floor
 
-from components.video_processing.video_processing_utils import format_photo_to_vertical
+from components.video_processing.media_probe import probe_media
+from components.video_processing.proxy_media import ProxyMedia
+from components.video_processing.video_processing_utils import (
+    CommandRunner,
+    format_photo_to_vertical,
+)
 from utils.data_structures import (
     INSTAGRAM_RESOLUTION,
+    RENDER_PROFILES,
     DataTypeEnum,
     LoadedVideo,
     MediaClip,
+    RenderProfile,
+    RenderProfileEnum,
 )
+from utils.media_cache import CACHE_ROOT, DiskCache, cache_key, file_fingerprint
+from utils.tracing import in_trace_context, span
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
 
 
 class VideoPreprocessing:
-    INSTAGRAM_FPS = 30
-    TEMP = "temp"
-
-    def __init__(self):
-        self.cfr_cache = {}  # {original_path: converted_path}
-        self.temp_cfr_files = []  # For cleanup
+    CFR_CACHE = "cfr"
+    CFR_CACHE_MAX_BYTES = 20 * 1024**3
+    CFR_PRE_ROLL = 0.5  # seconds kept around the referenced window
+    PHOTO_CACHE = "photos"
+    PHOTO_CACHE_MAX_BYTES = 2 * 1024**3
+
+    def __init__(
+        self,
+        cfr_cache_max_bytes=CFR_CACHE_MAX_BYTES,
+        cache_root=CACHE_ROOT,
+        profile: RenderProfile = RENDER_PROFILES[RenderProfileEnum.FINAL],
+        low_priority=False,
+        proxy_media: ProxyMedia = None,
+    ):
+        self.cfr_cache = {}  # {(original_path, fps, window): converted_path}
+        self.profile = profile
+        self.transcode_cache = DiskCache(self.CFR_CACHE, cfr_cache_max_bytes, cache_root)
+        self.photo_cache = DiskCache(self.PHOTO_CACHE, self.PHOTO_CACHE_MAX_BYTES, cache_root)
+        self.command_runner = CommandRunner(low_priority)
+        self.proxy_media = proxy_media
         self.logger = logging.getLogger(__name__)
 
-    def cleanup_temp_files(self):
-        for path in self.temp_cfr_files:
-            try:
-                os.remove(path)
-                self.logger.info(f"Deleted temp CFR file: {path}")
-            except Exception as e:
-                self.logger.warning(f"Failed to delete {path}: {e}")
-
-    def convert_to_cfr(self, input_path, target_fps=30):
-        """Convert a VFR video to CFR and return cached path if already done."""
-        if input_path in self.cfr_cache:
-            return self.cfr_cache[input_path]
-
-        # Use temp file with name derived from input for reuse
-
-        temp_dir = os.path.join(os.getcwd(), self.TEMP)
-        os.makedirs(temp_dir, exist_ok=True)
-        base_name = os.path.basename(input_path)
-        name_no_ext = os.path.splitext(base_name)[0]
-        output_path = os.path.join(
-            temp_dir,
-            f"{name_no_ext}_cfr_{target_fps}fps.mp4",
-        )
-
-        if os.path.exists(output_path):
-            self.logger.info(f"Using cached CFR file: {output_path}")
-            self.cfr_cache[input_path] = output_path
-            return output_path
-
-        cmd = [
-            "ffmpeg",
-            "-i",
-            input_path,
+    def _run_command(self, cmd):
+        """Run an ffmpeg command, at lowered priority for background work. Raises CalledProcessError on failure."""
+        self.command_runner.run(cmd)
+
+    def terminate_processes(self):
+        """Kill the ffmpeg processes started by this instance and refuse new ones, e.g. on cancellation."""
+        self.command_runner.terminate()
+
+    def load_vertical_photo(self, photo_path):
+        """
+        Photo formatted to the reel resolution. The RGB frame is cached on disk as a .npy file keyed by
+        the source fingerprint and INSTAGRAM_RESOLUTION, and returned memory-mapped.
+        """
+        try:
+            key = cache_key(file_fingerprint(photo_path), INSTAGRAM_RESOLUTION)
+        except OSError:
+            return format_photo_to_vertical(photo_path, INSTAGRAM_RESOLUTION)
+
+        with self.photo_cache.lock(key):
+            cached_path = self.photo_cache.get(key, ".npy")
+            if cached_path is None:
+                with span("photo_format", file=photo_path):
+                    formatted_img = format_photo_to_vertical(photo_path, INSTAGRAM_RESOLUTION)
+                temp_path = self.photo_cache.temp_path_for(key, ".npy")
+                try:
+                    np.save(temp_path, formatted_img)
+                except Exception:
+                    self.photo_cache.discard(temp_path)
+                    raise
+                cached_path = self.photo_cache.commit(temp_path, key, ".npy")
+                self.logger.info(f"Cached formatted photo: {cached_path}")
+        return np.load(cached_path, mmap_mode="r")
+
+    def prewarm_entry(self, file_path, entry: MediaClip, media_dir):
+        """
+        Run the cacheable part of process_entry (probes, CFR conversion, photo formatting)
+        without opening any clip, so a later process_entry finds everything ready.
+        """
+        full_path = os.path.join(media_dir, file_path)
+        if entry.type == DataTypeEnum.VIDEO.value:
+            status, avg_fps = self.is_variable_framerate(full_path)
+            if status and entry.video_resampling:
+                full_path = self.convert_to_cfr(full_path, avg_fps, self.cfr_window(entry.start, entry.end))
+                probe_media(full_path)
+        elif entry.type == DataTypeEnum.PHOTO.value:
+            self.load_vertical_photo(full_path)
+
+    def cfr_window(self, start, end):
+        """Source window transcoded for a clip trimmed to [start, end], padded by the pre-roll margin."""
+        return max(0, start - self.CFR_PRE_ROLL), end + self.CFR_PRE_ROLL
+
+    def convert_to_cfr(self, input_path, target_fps=30, window=None):
+        """
+        Convert a VFR video to CFR, reusing the persistent transcode cache when possible.
+        With a (start, end) window only that part of the source is transcoded; the output starts at ``start``.
+        """
+        memo_key = (input_path, target_fps, window)
+        if memo_key in self.cfr_cache:
+            return self.cfr_cache[memo_key]
+
+        window_args = []
+        if window is not None:
+            window_start, window_end = window
+            window_args = ["-ss", str(window_start), "-t", str(window_end - window_start)]
+        # Source frame rate and resolution are kept, the profile only decides the encoder trade-off
+        encode_args = [
             "-r",
             str(target_fps),
             "-vsync",
@@ -67,100 +125,121 @@ class VideoPreprocessing:
             "-c:v",
             "libx264",
             "-preset",
-            "slow",
-            "-crf",
-            "18",
-            "-c:a",
-            "aac",
-            "-b:a",
-            "192k",
-            "-y",
-            output_path,
+            self.profile.preset,
+            *self.profile.rate_control_args(),
+            *self.profile.audio_args(),
         ]
-        subprocess.run(
-            cmd,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            check=True,
-        )
-        self.logger.info(f"Converted to CFR: {output_path}")
-
-        self.cfr_cache[input_path] = output_path
-        self.temp_cfr_files.append(output_path)
+        key = cache_key(file_fingerprint(input_path), window_args, encode_args)
+
+        with self.transcode_cache.lock(key):
+            output_path = self.transcode_cache.get(key, ".mp4")
+            if output_path is not None:
+                self.logger.info(f"Using cached CFR file: {output_path}")
+            else:
+                temp_path = self.transcode_cache.temp_path_for(key, ".mp4")
+                cmd = ["ffmpeg", *window_args, "-i", input_path, *encode_args, "-y", temp_path]
+                try:
+                    with span("cfr_transcode", file=input_path):
+                        self._run_command(cmd)
+                except Exception:
+                    self.transcode_cache.discard(temp_path)
+                    raise
+                output_path = self.transcode_cache.commit(temp_path, key, ".mp4")
+                self.logger.info(f"Converted to CFR: {output_path}")
+
+        self.cfr_cache[memo_key] = output_path
         return output_path
 
     def is_variable_framerate(self, video_path):
         """
-        Returns a tuple: (is_variable, avg_framerate_float)
+        Returns a tuple: (is_variable, avg_framerate)
         - is_variable: True if variable framerate detected
-        - avg_framerate_float: average framerate as float, or None on failure
+        - avg_framerate: average (or else nominal) framerate rounded down, or None when unknown
         """
-        cmd = [
-            "ffprobe",
-            "-v",
-            "error",
-            "-select_streams",
-            "v:0",
-            "-show_entries",
-            "stream=r_frame_rate,avg_frame_rate",
-            "-of",
-            "default=noprint_wrappers=1:nokey=1",
-            video_path,
-        ]
-        try:
-            output = (
-                subprocess.check_output(
-                    cmd,
-                    stderr=subprocess.DEVNULL,
-                )
-                .decode()
-                .split()
-            )
-            if len(output) >= 2:
-                r_fps = eval(output[0])  # example: '30000/1001'
-                avg_fps = eval(output[1])
-                is_var = not (r_fps == avg_fps)
-                if is_var:
-                    self.logger.warning(
-                        f"Variable frame rate detected in: {video_path}",
-                    )
-
-                return is_var, floor(avg_fps)
-        except Exception as e:
-            self.logger.error(f"ffprobe failed on {video_path}: {e}")
+        info = probe_media(video_path)
+        if info is None:
             return False, None
-
-    def process_entry(self, file_path, entry: MediaClip, media_dir) -> LoadedVideo:
-        full_path = os.path.join(media_dir, file_path)
-        media_type = entry.type
-        start = entry.start
-        end = entry.end
-        loaded_video = LoadedVideo(transition=entry.transition)
-
-        if media_type == DataTypeEnum.VIDEO.value:
-            # Detect and convert VFR to CFR
-            status, avg_fps = self.is_variable_framerate(full_path)
-            if status and entry.video_resampling:
-                self.logger.info(f"Converting {file_path} to CFR.")
-                full_path = self.convert_to_cfr(full_path, avg_fps)
-
-            clip = VideoFileClip(full_path)
-            if end > clip.duration:
-                self.logger.warning(
-                    f"End time {end}s exceeds video duration {clip.duration:.2f}s for file: {file_path}",
-                )
-                end = clip.duration
-            clip = clip.subclipped(start, end)
-
-        elif media_type == DataTypeEnum.PHOTO.value:
-            duration = end - start
-            formatted_img = format_photo_to_vertical(
-                full_path,
-                INSTAGRAM_RESOLUTION,
+        # ffprobe reports 0/0 when it cannot average the frame rate, fall back to the nominal rate
+        fps = info.avg_fps if info.avg_fps > 0 else info.r_fps
+        if fps <= 0:
+            self.logger.warning(f"Unknown frame rate, keeping the source as is: {video_path}")
+            return False, None
+        if info.is_variable_framerate:
+            self.logger.warning(
+                f"Variable frame rate detected in: {video_path}",
             )
-            clip = ImageClip(formatted_img).with_duration(duration)
-        else:
-            raise ValueError(f"Unsupported media type: {media_type}")
+        return info.is_variable_framerate, math.floor(fps)
 
-        loaded_video.clip = clip.with_duration(end - start).with_fps(self.INSTAGRAM_FPS)
-        return loaded_video
+    def process_entry(self, file_path, entry: MediaClip, media_dir) -> LoadedVideo:
+        with span("process_entry", file=file_path):
+            full_path = os.path.join(media_dir, file_path)
+            media_type = entry.type
+            start = entry.start
+            end = entry.end
+            loaded_video = LoadedVideo(transition=entry.transition, source=(file_path, entry, media_dir))
+
+            if media_type == DataTypeEnum.VIDEO.value:
+                proxy_path = self.proxy_media.get(full_path) if self.proxy_media is not None else None
+                if proxy_path is not None:
+                    # Previews decode the low resolution proxy, which is already CFR and keeps the source timestamps
+                    full_path = proxy_path
+                    status = False
+                else:
+                    # Detect and convert VFR to CFR
+                    status, avg_fps = self.is_variable_framerate(full_path)
+                if status and entry.video_resampling:
+                    window = self.cfr_window(start, end)
+                    self.logger.info(f"Converting {file_path} [{window[0]:.2f}s - {window[1]:.2f}s] to CFR.")
+                    full_path = self.convert_to_cfr(full_path, avg_fps, window)
+                    # The CFR file starts at the beginning of the window
+                    start, end = start - window[0], end - window[0]
+
+                info = probe_media(full_path)
+                with span("open_clip", file=file_path):
+                    clip = VideoFileClip(full_path)
+                duration = info.duration if info is not None else clip.duration
+                if end > duration:
+                    self.logger.warning(
+                        f"End time {end}s exceeds video duration {duration:.2f}s for file: {file_path}",
+                    )
+                    end = duration
+                clip = clip.subclipped(start, end)
+
+            elif media_type == DataTypeEnum.PHOTO.value:
+                duration = end - start
+                formatted_img = self.load_vertical_photo(full_path)
+                loaded_video.still_frame = formatted_img
+                clip = ImageClip(formatted_img).with_duration(duration)
+            else:
+                raise ValueError(f"Unsupported media type: {media_type}")
+
+            loaded_video.clip = clip.with_duration(end - start).with_fps(self.profile.fps)
+            return loaded_video
+
+    def process_entries(
+        self, entries: dict[str, MediaClip], media_dir, max_workers=None
+    ) -> list[tuple[str, LoadedVideo | None]]:
+        """
+        Prepare entries concurrently on a bounded worker pool.
+        Returns (file_path, loaded_video) pairs in config order; entries that failed are logged
+        and returned with None so one broken file does not stop the others.
+        """
+        if not entries:
+            return []
+        if max_workers is None:
+            max_workers = max(1, min(len(entries), (os.cpu_count() or 1) - 2))
+
+        process_entry = in_trace_context(self.process_entry)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                (file_path, executor.submit(process_entry, file_path, entry, media_dir))
+                for file_path, entry in entries.items()
+            ]
+            results = []
+            for file_path, future in futures:
+                try:
+                    results.append((file_path, future.result()))
+                except Exception as e:
+                    self.logger.info(f"Error processing {file_path}: {e}")
+                    results.append((file_path, None))
+        return results
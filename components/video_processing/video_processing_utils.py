@@ -1,10 +1,21 @@
+import logging
 import os
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import replace
 
 import cv2
 import numpy as np
 from PIL import Image
 
+from components.video_processing.encoder_probe import probe_encoders
+from utils.data_structures import RENDER_PROFILES, RenderProfile, RenderProfileEnum
+from utils.tracing import span
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
+logger = logging.getLogger(__name__)
+
 
 def format_photo_to_vertical(photo_path, reel_size=(1080, 1920)):
     # Load image
@@ -27,56 +38,197 @@ def format_photo_to_vertical(photo_path, reel_size=(1080, 1920)):
     return np.array(bg_pil)
 
 
-def has_nvenc_support():
-    try:
-        # Run ffmpeg -encoders and capture output
-        result = subprocess.run(
-            ["ffmpeg", "-hide_banner", "-encoders"],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        encoders = result.stdout.lower()
-        # Check for NVENC encoders
-        return "h264_nvenc" in encoders or "hevc_nvenc" in encoders
-    except FileNotFoundError:
-        print("FFmpeg is not installed or not found in PATH.")
-        return False
-    except subprocess.CalledProcessError as e:
-        print("FFmpeg error:", e)
-        return False
-
-
-def has_nvidia_gpu():
-    try:
-        result = subprocess.run(
-            ["nvidia-smi"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            check=True,
+class CommandRunner:
+    """Runs ffmpeg commands, at lowered priority for background work, and can kill the ones still running."""
+
+    def __init__(self, low_priority=False):
+        self.low_priority = low_priority
+        self._processes = set()
+        self._processes_lock = threading.Lock()
+        self._terminated = False
+
+    def run(self, cmd):
+        """Run a command to completion. Raises CalledProcessError on failure."""
+        kwargs = {}
+        if self.low_priority:
+            if os.name == "posix":
+                cmd = ["nice", "-n", "10", *cmd]
+            else:
+                kwargs["creationflags"] = subprocess.BELOW_NORMAL_PRIORITY_CLASS
+        with self._processes_lock:
+            if self._terminated:
+                raise RuntimeError("Command runner was terminated")
+            proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **kwargs)
+            self._processes.add(proc)
+        try:
+            returncode = proc.wait()
+        finally:
+            with self._processes_lock:
+                self._processes.discard(proc)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd)
+
+    def terminate(self):
+        """Kill the running processes and refuse new ones, e.g. on cancellation."""
+        with self._processes_lock:
+            self._terminated = True
+            processes = list(self._processes)
+        for proc in processes:
+            proc.kill()
+
+
+class BackgroundPool:
+    """
+    Small pool for background work that is cancelled as a whole. Starting a new run cancels the previous one:
+    pending jobs are dropped and the on_cancel hook of the run kills what is still running.
+    """
+
+    def __init__(self, name, max_workers=2):
+        self.name = name
+        self.max_workers = max_workers
+        self.logger = logging.getLogger(__name__)
+        self._executor = None
+        self._futures = []
+        self._cancelled = threading.Event()
+        self._on_cancel = None
+
+    def start(self, fn, jobs: list[tuple], on_cancel=None):
+        """Call fn(*args) for every args tuple of jobs. Failures are logged, not raised."""
+        self.cancel()
+        if not jobs:
+            return
+        self._cancelled = threading.Event()
+        self._on_cancel = on_cancel
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        self._futures = [self._executor.submit(self._run, fn, self._cancelled, args) for args in jobs]
+
+    def _run(self, fn, cancelled, args):
+        if cancelled.is_set():
+            return
+        try:
+            fn(*args)
+        except Exception as e:
+            if not cancelled.is_set():
+                self.logger.warning(f"Background {self.name} failed for {args[0]}: {e}")
+
+    def cancel(self):
+        """Drop pending jobs and kill the ones still running."""
+        self._cancelled.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._on_cancel is not None:
+            self._on_cancel()
+            self._on_cancel = None
+        self._futures = []
+
+    def is_running(self) -> bool:
+        return any(not future.done() for future in self._futures)
+
+    def wait(self, timeout=None):
+        wait(self._futures, timeout=timeout)
+
+
+def letterbox_size(size, target_size):
+    """Largest size with the aspect ratio of ``size`` that fits in ``target_size``."""
+    clip_w, clip_h = size
+    target_w, target_h = target_size
+    if clip_w / clip_h > target_w / target_h:
+        # Too wide, match width and scale height
+        return target_w, int(target_w * clip_h / clip_w)
+    # Too tall, match height and scale width
+    return int(target_h * clip_w / clip_h), target_h
+
+
+class LetterboxTransform:
+    """
+    Per-frame letterbox/pillarbox: each frame is resized once straight into the center of a black canvas.
+    The canvas is allocated once per thread and its borders are never rewritten, so the returned frame is
+    reused by the next call on the same thread.
+    """
+
+    def __init__(self, size, target_size):
+        self.target_size = target_size
+        self.size = letterbox_size(size, target_size)
+        target_w, target_h = target_size
+        new_w, new_h = self.size
+        self.x = (target_w - new_w) // 2
+        self.y = (target_h - new_h) // 2
+        self._local = threading.local()
+
+    def __call__(self, frame):
+        if frame.dtype != np.uint8:
+            frame = frame.astype(np.uint8)
+        target_w, target_h = self.target_size
+        shape = (target_h, target_w) + frame.shape[2:]
+        canvas = getattr(self._local, "canvas", None)
+        if canvas is None or canvas.shape != shape:
+            canvas = self._local.canvas = np.zeros(shape, np.uint8)
+        new_w, new_h = self.size
+        interpolation = cv2.INTER_AREA if new_w < frame.shape[1] else cv2.INTER_LINEAR
+        cv2.resize(
+            frame,
+            self.size,
+            dst=canvas[self.y : self.y + new_h, self.x : self.x + new_w],
+            interpolation=interpolation,
         )
-        # Print basic GPU info (optional)
-        print("🖥️ NVIDIA GPU detected:\n", result.stdout.split("\n")[2])
-        return True
-    except FileNotFoundError:
-        print("⚠️ 'nvidia-smi' not found. Is the NVIDIA driver installed?")
-    except subprocess.CalledProcessError as e:
-        print("❌ 'nvidia-smi' failed to run. Error:\n", e.stderr)
-    return False
-
-
-def get_codec():
-    if has_nvenc_support() and has_nvidia_gpu():
+        return canvas
+
+
+def get_render_profile(name: RenderProfileEnum) -> RenderProfile:
+    """
+    The named render profile tuned to this machine. Draft and preview renders are bound by encode speed and
+    take the best libx264 preset that the cached benchmark finds about as fast as theirs.
+    """
+    profile = RENDER_PROFILES[name]
+    if name == RenderProfileEnum.FINAL:
+        return profile
+    preset = probe_encoders().fast_preset(profile.preset)
+    return profile if preset == profile.preset else replace(profile, preset=preset)
+
+
+def get_codec(profile: RenderProfile = None):
+    """
+    H.264 encoder for renders, read from the cached encoder probe: NVENC when it works here and accepts the
+    preset of the profile, libx264 otherwise.
+    """
+    capabilities = probe_encoders()
+    if capabilities.has_encoder("h264_nvenc") and (
+        profile is None or capabilities.supports_preset("h264_nvenc", profile.encoder_preset("h264_nvenc"))
+    ):
         codec = "h264_nvenc"
-        print("✅ NVENC GPU acceleration is available.")
+        logger.info("NVENC GPU acceleration is available.")
     else:
         codec = "libx264"
         # codec = "h264_qsv"
-        print("⚠️ Falling back to CPU encoding.")
+        logger.info("Falling back to CPU encoding.")
     return codec
 
 
+def concat_video_parts(part_files, output_path, audio_path="", audio_start=0, duration=None):
+    """
+    Join video parts encoded with identical parameters by stream copy (concat demuxer),
+    optionally muxing in the audio track trimmed to [audio_start, audio_start + duration].
+    """
+    list_path = f"{output_path}.parts.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for part in part_files:
+            f.write(f"file '{os.path.abspath(part)}'\n")
+
+    cmd = ["ffmpeg", "-hide_banner", "-y", "-f", "concat", "-safe", "0", "-i", list_path]
+    if audio_path:
+        cmd += ["-ss", str(audio_start)]
+        if duration is not None:
+            cmd += ["-t", str(duration)]
+        cmd += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0", "-c:a", "aac"]
+    cmd += ["-c:v", "copy", "-movflags", "+faststart", output_path]
+    try:
+        with span("concat_parts", parts=len(part_files)):
+            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    finally:
+        os.remove(list_path)
+
+
 def video_to_frames(segment, output_dir="frames"):
     """
     Extract frames from a video segment and save as JPEGs.
@@ -1,17 +1,28 @@
+import time
+
 import cv2
-import numpy as np
-from moviepy import ImageSequenceClip, concatenate_videoclips
+from moviepy import VideoClip, concatenate_videoclips
 from moviepy.video.fx.CrossFadeIn import CrossFadeIn
 from moviepy.video.fx.CrossFadeOut import CrossFadeOut
 from moviepy.video.fx.FadeIn import FadeIn
 from moviepy.video.fx.FadeOut import FadeOut
-from tqdm import tqdm
 
-from utils.data_structures import FPS, TransitionTypeEnum
+from components.video_processing.transition_kernels import (
+    FrameBuffers,
+    as_uint8,
+    blend_into,
+    get_slide_kernel,
+    get_warp_plan,
+    warp_into,
+    zoom_scales,
+)
+from utils.data_structures import TransitionTypeEnum
+from utils.tracing import record_span
 
 
 class VideoTransitions:
     def __init__(self):
+        self.frame_buffers = FrameBuffers()
         self.transitions = {
             TransitionTypeEnum.SLIDE: self.slide_transition,
             TransitionTypeEnum.ZOOM: self.zoom_transition,
@@ -20,211 +31,109 @@ class VideoTransitions:
             TransitionTypeEnum.NONE: self.no_transition,
             TransitionTypeEnum.SPIN: self.spin_transition,
         }
+        # Per-frame blends of the transitions overlapping the two clips
+        self.blend_frames = {
+            TransitionTypeEnum.SLIDE: self.slide_frame,
+            TransitionTypeEnum.ZOOM: self.zoom_blend_frame,
+            TransitionTypeEnum.SPIN: self.spin_frame,
+        }
 
     @staticmethod
-    def clip_to_frames(clip, fps=FPS):
-        """Render all frames of a clip to a list of numpy arrays (RGB)."""
-        duration = clip.duration
-        frames = []
-        for t in np.arange(0, duration, 1 / fps):
-            frame = clip.get_frame(t)  # returns (H,W,3) RGB numpy array
-            frames.append(frame)
-        return frames
-
-    def slide_transition(self, clip1, clip2, duration=0.1, fps=30, blend_width=0):
-        # slide direction
-        frames1 = self.clip_to_frames(clip1, fps)
-        frames2 = self.clip_to_frames(clip2, fps)
-
-        w = frames1[0].shape[1]
-        transition_frames = int(duration * fps)
-
-        output_frames = []
-
-        # Write frames1 until transition start
-        output_frames.extend(frames1[:-transition_frames])
-
-        for i in range(transition_frames):
-            progress = i / transition_frames
-            x_offset = int(w * (1 - progress))
-
-            frame1 = frames1[-transition_frames + i]
-            frame2 = frames2[i]
-
-            frame = np.zeros_like(frame1)
-
-            # Slide clip1 out left
-            if x_offset > blend_width:
-                frame[:, : x_offset - blend_width] = frame1[:, w - x_offset + blend_width : w]
-
-            # Slide clip2 in right
-            if x_offset + blend_width < w:
-                frame[:, x_offset + blend_width :] = frame2[:, : w - (x_offset + blend_width)]
-
-            # Blend seam area with linear alpha
-            if 0 < x_offset < w:
-                for bw in range(blend_width):
-                    alpha = bw / blend_width
-                    col1 = w - x_offset + bw
-                    col2 = x_offset - blend_width + bw
-
-                    if 0 <= col1 < w and 0 <= col2 < w:
-                        # Blend the two columns at seam
-                        frame[:, col2] = (frame1[:, col1] * (1 - alpha) + frame2[:, col2] * alpha).astype(np.uint8)
-
-            output_frames.append(frame)
-
-        # Append remaining frames2 after transition
-        output_frames.extend(frames2[transition_frames:])
-
-        final_clip = ImageSequenceClip(output_frames, fps=fps)
-        return final_clip
-
-    @staticmethod
-    def rotate_frame(frame, angle, output_size):
+    def transition_window(clip1, clip2, duration, fps, blend_frame):
         """
-        Rotate a frame around its center and resize/pad/crop to output_size.
+        Lazy clip of the window where the tail of clip1 overlaps the head of clip2, or None if there is no room.
+        Frames are decoded and blended on demand, so memory is bounded by a single frame.
+        blend_frame(index, transition_frames, frame1, frame2) returns the blended output frame.
         """
-        h, w = frame.shape[:2]
-        center = (w // 2, h // 2)
-
-        # Rotation matrix
-        M = cv2.getRotationMatrix2D(center, angle, 1.0)
-        rotated = cv2.warpAffine(
-            frame,
-            M,
-            (w, h),
-            flags=cv2.INTER_LINEAR,
-            borderMode=cv2.BORDER_CONSTANT,
-            borderValue=0,
-        )
-
-        # Ensure final size is output_size (crop or pad as needed)
-        out_w, out_h = output_size
-        resized = cv2.resize(rotated, (out_w, out_h))
-        return resized
+        transition_frames = min(int(duration * fps), int(clip1.duration * fps), int(clip2.duration * fps))
+        if transition_frames <= 0:
+            return None
+        window = transition_frames / fps
+        tail = clip1.subclipped(clip1.duration - window)
+        head = clip2.subclipped(0, window)
+        # One span per pass over the window: it starts at the first blend and lasts the blending time summed
+        # over the frames, recorded once the last frame is blended
+        first_ns = None
+        blend_ns = 0
+
+        def frame_function(t):
+            nonlocal first_ns, blend_ns
+            i = min(int(round(t * fps)), transition_frames - 1)
+            frame1 = tail.get_frame(i / fps)
+            frame2 = head.get_frame(i / fps)
+            start_ns = time.perf_counter_ns()
+            frame = blend_frame(i, transition_frames, frame1, frame2)
+            first_ns = first_ns or start_ns
+            blend_ns += time.perf_counter_ns() - start_ns
+            if i == transition_frames - 1:
+                record_span("transition_window", first_ns, blend_ns, frames=transition_frames)
+                first_ns, blend_ns = None, 0
+            return frame
+
+        return VideoClip(frame_function, duration=window).with_fps(fps)
+
+    def overlap_transition(self, clip1, clip2, duration, fps, blend_frame):
+        """
+        Join two clips overlapping by ``duration``. Only the transition window is blended,
+        the rest of each clip stays a plain subclip.
+        """
+        transition = self.transition_window(clip1, clip2, duration, fps, blend_frame)
+        if transition is None:
+            return concatenate_videoclips([clip1, clip2], method="compose")
+        window = transition.duration
+
+        parts = []
+        if clip1.duration > window:
+            parts.append(clip1.subclipped(0, clip1.duration - window))
+        parts.append(transition)
+        if clip2.duration > window:
+            parts.append(clip2.subclipped(window))
+        return concatenate_videoclips(parts, method="compose")
 
     @staticmethod
-    def frame_generator(clip, fps):
-        t = 0
-        while t < clip.duration:
-            yield clip.get_frame(t)
-            t += 1 / fps
-
-    def spin_transition(self, clip1, clip2, duration=0.1, fps=30):
-        transition_frames = int(duration * fps)
-        output_frames = []
-
-        w, h = clip1.size
-        output_size = (w, h)
-
-        frames1_gen = self.frame_generator(clip1, fps)
-        frames2_gen = self.frame_generator(clip2, fps)
-
-        # Pre-transition frames from clip1
-        for _ in tqdm(
-            range(int(clip1.duration * fps) - transition_frames),
-            desc="Pre-transition in spin transition",
-        ):
-            output_frames.append(next(frames1_gen))
+    def slide_frame(i, transition_frames, frame1, frame2, blend_width=0):
+        return get_slide_kernel(frame1.shape[1], transition_frames, blend_width).render(i, frame1, frame2)
 
-        # Transition frames
-        for i in tqdm(range(transition_frames), desc="Generating spin transition"):
-            progress = i / transition_frames
-
-            frame1 = next(frames1_gen)
-            frame2 = next(frames2_gen)
-
-            angle1 = 360 * progress
-            alpha1 = 1 - progress
-            rotated1 = self.rotate_frame(frame1, angle1, output_size)
-
-            angle2 = -360 + 360 * progress
-            alpha2 = progress
-            rotated2 = self.rotate_frame(frame2, angle2, output_size)
+    def slide_transition(self, clip1, clip2, duration=0.1, fps=30, blend_width=0):
+        return self.overlap_transition(
+            clip1,
+            clip2,
+            duration,
+            fps,
+            lambda i, n, frame1, frame2: self.slide_frame(i, n, frame1, frame2, blend_width),
+        )
 
-            blended = (rotated1.astype(np.float32) * alpha1 + rotated2.astype(np.float32) * alpha2).astype(np.uint8)
-            output_frames.append(blended)
+    def _warp_blend_frame(self, transition, i, transition_frames, frame1, frame2, direction="in_out"):
+        # The buffers are uint8, cv2 reallocates warps of other dtypes and cannot blend mixed ones
+        frame1, frame2 = as_uint8(frame1), as_uint8(frame2)
+        h, w = frame1.shape[:2]
+        if frame2.shape != frame1.shape:
+            frame2 = cv2.resize(frame2, (w, h))
+        plan = get_warp_plan(transition, (w, h), transition_frames, direction)
+        warped1 = warp_into(frame1, plan[i, 0], self.frame_buffers.get("warp1", frame1.shape))
+        warped2 = warp_into(frame2, plan[i, 1], self.frame_buffers.get("warp2", frame1.shape))
+        return blend_into(warped1, warped2, i / transition_frames, self.frame_buffers.get("blend", frame1.shape))
 
-        # Post-transition frames from clip2
-        for frame in frames2_gen:
-            frame_resized = cv2.resize(frame, output_size)
-            output_frames.append(frame_resized)
+    def spin_frame(self, i, transition_frames, frame1, frame2):
+        return self._warp_blend_frame(TransitionTypeEnum.SPIN, i, transition_frames, frame1, frame2)
 
-        return ImageSequenceClip(output_frames, fps=fps)
+    def spin_transition(self, clip1, clip2, duration=0.1, fps=30):
+        if tuple(clip2.size) != tuple(clip1.size):
+            clip2 = clip2.resized(new_size=clip1.size)
+        return self.overlap_transition(clip1, clip2, duration, fps, self.spin_frame)
 
-    def zoom_frame(self, frame, scale):
-        """
-        Zoom in/out frame by scale factor keeping output size same by cropping/padding.
-        scale >1 = zoom in, scale <1 = zoom out
-        """
-        h, w = frame.shape[:2]
-        new_w, new_h = int(w * scale), int(h * scale)
-
-        # Resize frame
-        resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
-
-        if scale > 1:
-            # Crop center to original size
-            x_start = (new_w - w) // 2
-            y_start = (new_h - h) // 2
-            cropped = resized[y_start : y_start + h, x_start : x_start + w]
-            return cropped
-        else:
-            # Pad resized to original size
-            pad_x1 = (w - new_w) // 2
-            pad_y1 = (h - new_h) // 2
-            pad_x2 = w - new_w - pad_x1
-            pad_y2 = h - new_h - pad_y1
-            padded = cv2.copyMakeBorder(resized, pad_y1, pad_y2, pad_x1, pad_x2, cv2.BORDER_CONSTANT, value=0)
-            return padded
+    def zoom_blend_frame(self, i, transition_frames, frame1, frame2, direction="in_out"):
+        return self._warp_blend_frame(TransitionTypeEnum.ZOOM, i, transition_frames, frame1, frame2, direction)
 
     def zoom_transition(self, clip1, clip2, duration=0.1, fps=30, direction="in_out"):
-        transition_frames = int(duration * fps)
-
-        frames1_gen = (clip1.get_frame(t) for t in np.arange(0, clip1.duration, 1 / fps))
-        frames2_gen = (clip2.get_frame(t) for t in np.arange(0, clip2.duration, 1 / fps))
-
-        output_frames = []
-        total_frames1 = int(clip1.duration * fps)
-
-        for _ in range(total_frames1 - transition_frames):
-            output_frames.append(next(frames1_gen))
-
-        for i in tqdm(range(transition_frames), desc="Generating zoom transition"):
-            progress = i / transition_frames
-            frame1 = next(frames1_gen)
-            frame2 = next(frames2_gen)
-
-            # Determine zoom scale and alpha based on direction
-            if direction == "in_out":
-                scale1 = 1.2 - 0.2 * progress  # zoom out
-                scale2 = 0.8 + 0.2 * progress  # zoom in
-            elif direction == "out_in":
-                scale1 = 0.8 + 0.2 * progress  # zoom in
-                scale2 = 1.2 - 0.2 * progress  # zoom out
-            elif direction == "in":
-                scale1 = 1.0 + 0.2 * progress
-                scale2 = 1.0 + 0.2 * progress
-            elif direction == "out":
-                scale1 = 1.2 - 0.2 * progress
-                scale2 = 1.2 - 0.2 * progress
-            else:
-                raise ValueError("Invalid direction. Use 'in_out', 'out_in', 'in', or 'out'.")
-
-            alpha1 = 1 - progress
-            alpha2 = progress
-
-            zoomed1 = self.zoom_frame(frame1, scale1)
-            zoomed2 = self.zoom_frame(frame2, scale2)
-
-            blended = (zoomed1.astype(np.float32) * alpha1 + zoomed2.astype(np.float32) * alpha2).astype(np.uint8)
-            output_frames.append(blended)
-
-        for frame in frames2_gen:
-            output_frames.append(frame)
-
-        return ImageSequenceClip(output_frames, fps=fps)
+        zoom_scales(0, direction)  # fail early on an invalid direction
+        return self.overlap_transition(
+            clip1,
+            clip2,
+            duration,
+            fps,
+            lambda i, n, frame1, frame2: self.zoom_blend_frame(i, n, frame1, frame2, direction),
+        )
 
     @staticmethod
     def fade_transition(clip1, clip2, duration=0.05):
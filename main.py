@@ -2,11 +2,22 @@ import argparse
 import logging
 import os
 
+from components.video_processing.ffmpeg_render_engine import FFmpegRenderEngine
+from components.video_processing.proxy_media import ProxyMedia
 from components.video_processing.video_postprocessing import VideoPostProcessing
 from components.video_processing.video_preprocessing import VideoPreprocessing
-from components.video_processing.video_processing_utils import video_to_frames
-from utils.data_structures import DataTypeEnum, Segment
+from components.video_processing.video_processing_utils import (
+    get_render_profile,
+    video_to_frames,
+)
+from utils.data_structures import (
+    DataTypeEnum,
+    RenderEngineEnum,
+    RenderProfileEnum,
+    Segment,
+)
 from utils.json_handler import json_template_generator, pars_config
+from utils.tracing import span, trace_run
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
 logger = logging.getLogger(__name__)
@@ -15,39 +26,93 @@ MAX_DURATION = 90  # seconds
 GENERATE_JSON = 0
 
 
-def create_instagram_reel(config_file, media_dir, output_path, preview=False):
-    video_preprocessing = VideoPreprocessing()
-    video_preprocessing.cleanup_temp_files()
-    clips = []
+def apply_duration_budget(items, get_duration):
+    """Split (name, item) pairs, in config order, into the items fitting in MAX_DURATION and the skipped ones."""
+    accepted = []
+    skipped = []
     total_duration = 0
-    audio_path = ""
-    audio_start = 0
-    for filename, entry in config_file.items():
-        if entry.type == DataTypeEnum.AUDIO:
-            audio_path = filename
-            audio_start = entry.start
+    for name, item in items:
+        duration = get_duration(item)
+        if total_duration + duration > MAX_DURATION:
+            logger.info(f"Skipping {name}, would exceed max duration.")
+            skipped.append(item)
+            continue
+
+        accepted.append(item)
+        total_duration += duration
+    return accepted, skipped
+
+
+def create_instagram_reel(
+    config_file,
+    media_dir,
+    output_path,
+    preview=False,
+    max_workers=None,
+    engine=RenderEngineEnum.MOVIEPY,
+    chunk_workers=1,
+    proxy_media: ProxyMedia = None,
+    profile: RenderProfileEnum = None,
+):
+    render_profile = get_render_profile(profile or (RenderProfileEnum.PREVIEW if preview else RenderProfileEnum.FINAL))
+    # The trace of the run lands next to the output, previews get their own
+    trace_path = f"{os.path.splitext(output_path)[0]}{'.preview' if preview else ''}.trace.json"
+    with trace_run(trace_path), span("create_instagram_reel", profile=render_profile.name, engine=engine):
+        # Previews decode ready proxies instead of the originals, final renders always use the originals
+        video_preprocessing = VideoPreprocessing(profile=render_profile, proxy_media=proxy_media if preview else None)
+        audio_path = ""
+        audio_start = 0
+        media_entries = {}
+        for filename, entry in config_file.items():
+            if entry.type == DataTypeEnum.AUDIO:
+                audio_path = filename
+                audio_start = entry.start
+            else:
+                media_entries[filename] = entry
+
+        if engine == RenderEngineEnum.FFMPEG and not preview and not audio_path:
+            # The ffmpeg graph only carries the music track, the moviepy path keeps the audio of the clips
+            logger.info("No audio track selected, rendering with moviepy to keep the clip audio.")
+            engine = RenderEngineEnum.MOVIEPY
+        if engine == RenderEngineEnum.FFMPEG and not preview:
+            render_engine = FFmpegRenderEngine(video_preprocessing, render_profile)
+            timeline, _ = apply_duration_budget(
+                [
+                    (os.path.basename(path), (path, entry))
+                    for path, entry in render_engine.plan(media_entries, media_dir)
+                ],
+                lambda item: item[1].end - item[1].start,
+            )
+            if not timeline:
+                logger.info("No valid clips to process.")
+                return
+            render_engine.render(output_path, timeline, audio_path=audio_path, audio_start=audio_start)
+            return
+
+        # Entries are prepared in parallel, but the duration budget is applied in config order.
+        with span("preprocess", clips=len(media_entries)):
+            preprocessed = video_preprocessing.process_entries(media_entries, media_dir, max_workers)
+        clips, skipped = apply_duration_budget(
+            [(filename, clip) for filename, clip in preprocessed if clip is not None],
+            lambda clip: clip.clip.duration,
+        )
+        for clip in skipped:
+            clip.clip.close()
+
+        if not clips:
+            logger.info("No valid clips to process.")
+            return
+        video_postprocessing = VideoPostProcessing(render_profile)
+        if preview:
+            video_postprocessing.preview(clips, audio_path=audio_path, audio_start=audio_start)
         else:
-            try:
-                clip = video_preprocessing.process_entry(filename, entry, media_dir)
-                duration = clip.clip.duration
-                if total_duration + duration > MAX_DURATION:
-                    logger.info(f"Skipping {filename}, would exceed max duration.")
-                    continue
-
-                clips.append(clip)
-                total_duration += duration
-            except Exception as e:
-                logger.info(f"Error processing {filename}: {e}")
-
-    if not clips:
-        logger.info("No valid clips to process.")
-        return
-    video_postprocessing = VideoPostProcessing()
-    if preview:
-        video_postprocessing.preview(clips, audio_path=audio_path, audio_start=audio_start)
-    else:
-        video_postprocessing.final_render(output_path, clips, audio_path=audio_path, audio_start=audio_start)
-    video_preprocessing.cleanup_temp_files()
+            video_postprocessing.final_render(
+                output_path,
+                clips,
+                audio_path=audio_path,
+                audio_start=audio_start,
+                chunk_workers=chunk_workers,
+            )
 
 
 def create_video_cover(video_segments: list[Segment], output_dir):
@@ -74,6 +139,26 @@ def arg_paser():
         required=True,
         help="Full path to the dir with media.",
     )
+    parser.add_argument(
+        "--profile",
+        type=RenderProfileEnum,
+        choices=list(RenderProfileEnum),
+        default=RenderProfileEnum.FINAL,
+        help="Render profile (resolution, fps, encoder preset and quality): draft, preview or final.",
+    )
+    parser.add_argument(
+        "--engine",
+        type=RenderEngineEnum,
+        choices=list(RenderEngineEnum),
+        default=RenderEngineEnum.MOVIEPY,
+        help="Final render engine: moviepy (frame by frame in Python) or ffmpeg (single filter_complex, needs an audio track).",
+    )
+    parser.add_argument(
+        "--chunk_workers",
+        type=int,
+        default=1,
+        help="Processes rendering independent chunks of the timeline (split at clips without a transition).",
+    )
     return parser.parse_args()
 
 
@@ -83,4 +168,11 @@ if __name__ == "__main__":
     else:
         args = arg_paser()
         json_file = pars_config(args.config_path)
-        create_instagram_reel(json_file, args.media_dir, "test_output.mp4")
+        create_instagram_reel(
+            json_file,
+            args.media_dir,
+            "test_output.mp4",
+            profile=args.profile,
+            engine=args.engine,
+            chunk_workers=args.chunk_workers,
+        )
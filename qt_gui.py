@@ -8,6 +8,8 @@ from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont
 from PyQt5.QtWidgets import (
     QApplication,
+    QCheckBox,
+    QComboBox,
     QFileDialog,
     QGraphicsScene,
     QGraphicsTextItem,
@@ -30,6 +32,9 @@ from components.gui_components.qt_vertical_scroling_area import VerticalScrollAr
 from components.gui_components.qt_video_timeline import VideoTimelineWidget
 from components.gui_components.qt_waveform_item import WaveformItem
 from components.video_processing.play_video import VideoPlayerUI
+from components.video_processing.preprocessing_prewarm import PreprocessingPrewarmer
+from components.video_processing.proxy_media import ProxyMedia
+from components.video_processing.video_processing_utils import get_render_profile
 from main import create_instagram_reel, create_video_cover, logger
 from utils.data_structures import (
     FILE_NAME,
@@ -40,6 +45,8 @@ from utils.data_structures import (
     TIMELINE_START,
     DataTypeEnum,
     MediaClip,
+    RenderProfile,
+    RenderProfileEnum,
     Segment,
     TimelinesTypeEnum,
     TransitionTypeEnum,
@@ -49,7 +56,7 @@ from utils.json_handler import pars_config, save_json_config
 # TODO:
 # add button clear all timelines
 # add option to add watermark to the final video
-# optimize final render and establish some metrics for comparison
+# optimize final render (per-stage timings are in the .trace.json written next to each output)
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
 
@@ -81,6 +88,15 @@ class InstagramReelCreatorGui(QWidget):
         self.save_config_btn.clicked.connect(self.save_config)
         self.create_cover_btn.clicked.connect(self.create_video_cover)
 
+        # Render profile of previews and renders; auto uses preview for previews and final for the final render
+        self.profile_box = QComboBox()
+        self.profile_box.addItem("auto", None)
+        for profile in RenderProfileEnum:
+            self.profile_box.addItem(profile.value, profile)
+        self.profile_box.currentIndexChanged.connect(self.restart_prewarm)
+        # Fast previews stream copy whole GOPs of compatible sources and only encode the cut edges
+        self.smart_cut_box = QCheckBox("Smart cut")
+
         self.work_dir_btn = QPushButton("Select Work Dir")
         self.work_dir_box = QLineEdit(self)
 
@@ -92,6 +108,8 @@ class InstagramReelCreatorGui(QWidget):
         buttons_layout.addWidget(self.load_config_btn)
         buttons_layout.addWidget(self.save_config_btn)
         buttons_layout.addWidget(self.create_cover_btn)
+        buttons_layout.addWidget(self.profile_box)
+        buttons_layout.addWidget(self.smart_cut_box)
         self.work_dir_btn.clicked.connect(self.get_work_dir)
         self.layout.addLayout(buttons_layout)
         self.layout.addLayout(timeline_view_work_dir_layout)
@@ -99,6 +117,8 @@ class InstagramReelCreatorGui(QWidget):
 
         self.scroll = VerticalScrollArea()
         self.blocks_configs = {}
+        self.prewarmer = PreprocessingPrewarmer()
+        self.proxy_media = ProxyMedia()
 
         # ======================= Text Timeline View ===========================
         self.scroll.addWidget(get_header_text_label("Text Timeline"))
@@ -340,6 +360,14 @@ class InstagramReelCreatorGui(QWidget):
         self.blocks_configs |= self.text_timeline.load_timeline(config_data, config_dir)
         self.blocks_configs |= self.video_timeline.load_timeline(config_data, config_dir)
         self._load_audio_timeline(config_data)
+        self.prewarmer.start(self.blocks_configs, config_dir, self.prewarm_profile())
+        self.proxy_media.start(
+            [
+                os.path.join(config_dir, file_path)
+                for file_path, entry in self.blocks_configs.items()
+                if entry.type == DataTypeEnum.VIDEO
+            ]
+        )
 
     def create_video_cover(self):
         video_segments, _, _ = self.update_blocks_configs()
@@ -359,6 +387,21 @@ class InstagramReelCreatorGui(QWidget):
         for file, settings in config[TimelinesTypeEnum.AUDIO_TIMELINE.value].items():
             self.load_external_audio(file, settings.start, settings.end)
 
+    def selected_profile(self) -> RenderProfile:
+        """Profile of the previews started from here; auto previews with the preview profile."""
+        return get_render_profile(self.profile_box.currentData() or RenderProfileEnum.PREVIEW)
+
+    def prewarm_profile(self) -> RenderProfile:
+        """
+        Profile the Render button encodes with, auto renders with the final profile. The CFR intermediates are
+        cached per preset, pre-warm builds them for the render; previews decode the proxies.
+        """
+        return get_render_profile(self.profile_box.currentData() or RenderProfileEnum.FINAL)
+
+    def restart_prewarm(self):
+        if self.blocks_configs:
+            self.prewarmer.start(self.blocks_configs, self.work_dir_box.text(), self.prewarm_profile())
+
     def fast_preview(self):
         video_segments, audio_segments, text_segments = self.update_blocks_configs()
         self.video_frame.fast_preview(
@@ -366,6 +409,9 @@ class InstagramReelCreatorGui(QWidget):
             audio_segments,
             text_segments,
             os.path.abspath("preview"),
+            proxy_media=self.proxy_media,
+            profile=self.selected_profile(),
+            smart_cut=self.smart_cut_box.isChecked(),
         )
 
     def render_preview(self):
@@ -376,6 +422,12 @@ class InstagramReelCreatorGui(QWidget):
         self.update_blocks_configs()
         self.run_main_script(False)
 
+    def closeEvent(self, event):
+        self.prewarmer.cancel()
+        self.proxy_media.cancel()
+        self.video_frame.cancel_preview()
+        super().closeEvent(event)
+
     def draw_audio_time_grid(self, max_seconds, height):
         for second in range(max_seconds + 1):
             x = 10 + second * PIXELS_PER_SEC
@@ -387,14 +439,18 @@ class InstagramReelCreatorGui(QWidget):
     def run_main_script(self, preview: bool = False):
         # TODO:
         # add checks
-        threading.Thread(target=self.execute_script, args=(preview,), daemon=True).start()
+        threading.Thread(
+            target=self.execute_script, args=(preview, self.profile_box.currentData()), daemon=True
+        ).start()
 
-    def execute_script(self, preview):
+    def execute_script(self, preview, profile=None):
         create_instagram_reel(
             self.blocks_configs,
             self.work_dir_box.text(),
             os.path.join(self.work_dir_box.text(), "final_video.mp4"),
             preview,
+            proxy_media=self.proxy_media,
+            profile=profile,
         )
 
 
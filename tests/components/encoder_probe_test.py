@@ -0,0 +1,90 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from components.video_processing.encoder_probe import EncoderProbe
+
+ENCODERS_OUTPUT = """Encoders:
+ V..... = Video
+ ------
+ V....D libx264              libx264 H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10 (codec h264)
+ V....D h264_nvenc           NVIDIA NVENC H.264 encoder (codec h264)
+ V....D libx265              libx265 H.265 / HEVC (codec hevc)
+ V....D mpeg4                MPEG-4 part 2
+ A....D aac                  AAC (Advanced Audio Coding)
+"""
+
+LIBX264_HELP = """Encoder libx264 [libx264 H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10]:
+    General capabilities: dr1 delay threads
+libx264 AVOptions:
+  -preset            <string>     E..V....... Set the encoding preset (default "medium")
+  -crf               <float>      E..V....... Select the quality for constant quality mode
+     ultrafast                    E..V.......
+"""
+
+NVENC_HELP = """Encoder h264_nvenc [NVIDIA NVENC H.264 encoder]:
+h264_nvenc AVOptions:
+  -preset            <int>        E..V....... Set the encoding preset (from 0 to 18) (default p4)
+     default         0            E..V.......
+     slow            1            E..V....... hq 2 passes
+     p1              12           E..V....... fastest (lowest quality)
+     p7              18           E..V....... slowest (best quality)
+  -cq                <float>      E..V....... Set target quality level (0 to 51, 0 means automatic)
+"""
+
+
+def fake_ffmpeg(cmd):
+    if "-encoders" in cmd:
+        return ENCODERS_OUTPUT
+    if "-h" in cmd:
+        return LIBX264_HELP
+    if "h264_nvenc" in cmd:
+        raise subprocess.CalledProcessError(1, cmd)  # no GPU
+    return ""
+
+
+class TestEncoderProbe(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parse(self):
+        self.assertEqual(EncoderProbe.parse_encoders(ENCODERS_OUTPUT), ["libx264", "h264_nvenc", "libx265"])
+        self.assertEqual(EncoderProbe.parse_options(LIBX264_HELP), ["preset", "crf"])
+        self.assertEqual(EncoderProbe.parse_presets(LIBX264_HELP), [])
+        self.assertEqual(EncoderProbe.parse_presets(NVENC_HELP), ["default", "slow", "p1", "p7"])
+
+    @patch.object(EncoderProbe, "_binary_key", return_value="/usr/bin/ffmpeg|1|100")
+    @patch.object(EncoderProbe, "_run", side_effect=fake_ffmpeg)
+    def test_probe_is_cached_on_disk(self, mock_run, mock_binary_key):
+        capabilities = EncoderProbe(self.tmp.name).probe()
+        self.assertEqual(sorted(capabilities.encoders), ["libx264", "libx265"])
+        self.assertEqual(capabilities.encoders["libx264"], ["preset", "crf"])
+        self.assertTrue(capabilities.supports_preset("libx264", "ultrafast"))
+        self.assertEqual(sorted(capabilities.preset_fps), sorted(EncoderProbe.BENCHMARK_PRESETS))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, EncoderProbe.CAPABILITIES_FILE)))
+
+        mock_run.reset_mock()
+        self.assertEqual(EncoderProbe(self.tmp.name).probe(), capabilities)
+        mock_run.assert_not_called()
+
+        # A different ffmpeg binary invalidates the stored probe
+        mock_binary_key.return_value = "/usr/bin/ffmpeg|2|100"
+        EncoderProbe(self.tmp.name).probe()
+        mock_run.assert_called()
+
+    @patch.object(EncoderProbe, "_binary_key", return_value=None)
+    def test_missing_ffmpeg(self, _):
+        self.assertFalse(EncoderProbe(self.tmp.name).probe().has_encoder("libx264"))
+
+    @patch.object(EncoderProbe, "_binary_key", return_value="/usr/bin/ffmpeg|1|100")
+    @patch.object(EncoderProbe, "_run", side_effect=subprocess.CalledProcessError(1, "ffmpeg"))
+    def test_failed_probe_is_cached(self, mock_run, _):
+        self.assertEqual(EncoderProbe(self.tmp.name).probe().encoders, {})
+        mock_run.reset_mock()
+        self.assertEqual(EncoderProbe(self.tmp.name).probe().encoders, {})
+        mock_run.assert_not_called()
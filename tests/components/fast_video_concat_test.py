@@ -0,0 +1,147 @@
+import os
+import subprocess
+from dataclasses import replace
+from unittest.mock import patch
+
+import imageio_ffmpeg
+
+from components.video_processing.fast_video_concat import FFmpegConcat
+from components.video_processing.ffmpeg_jobs import FFmpegJobRunner
+from tests.conftest import MediaTestCase, fake_ffmpeg
+from utils.data_structures import RENDER_PROFILES, MediaInfo, RenderProfileEnum, Segment
+
+
+def h264_info(width, height, fps, profile="Main", level=30, has_b_frames=2):
+    return MediaInfo(4.0, width, height, fps, fps, 0, "h264", "yuv420p", None, profile, level, has_b_frames)
+
+
+class TestFFmpegConcat(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.concat = FFmpegConcat(cache_root=self.cache_root, scratch_root=os.path.join(self.tmp.name, "scratch"))
+
+    @patch.object(FFmpegConcat, "_run_ffmpeg", side_effect=fake_ffmpeg)
+    def test_segments_are_cached_per_trim(self, mock_run):
+        _, first, duration, _ = self.concat.process_video_segment(self.tmp.name, 0, Segment(self.video, 1, 3))
+        self.assertEqual(duration, 2)
+        self.assertTrue(os.path.exists(first))
+
+        # Same block on the next preview: no encode
+        _, again, _, _ = self.concat.process_video_segment(self.tmp.name, 0, Segment(self.video, 1, 3))
+        self.assertEqual(again, first)
+        self.assertEqual(mock_run.call_count, 1)
+
+        # A nudged block is encoded again
+        _, moved, _, _ = self.concat.process_video_segment(self.tmp.name, 0, Segment(self.video, 1.5, 3))
+        self.assertNotEqual(moved, first)
+        self.assertEqual(mock_run.call_count, 2)
+
+    @patch.object(FFmpegConcat, "_run_ffmpeg", return_value=False)
+    def test_failed_segment_is_not_cached(self, _):
+        i, path, _, _ = self.concat.process_video_segment(self.tmp.name, 3, Segment(self.video, 0, 1))
+        self.assertEqual((i, path), (3, None))
+        self.assertEqual(os.listdir(self.concat.segment_cache.directory), [])
+
+    def test_smart_cut_plan_copies_whole_gops(self):
+        pieces = FFmpegConcat.smart_cut_plan([0.0, 2.0, 4.0, 6.0, 8.0], 1.5, 7.0, 1 / 30)
+        self.assertEqual(pieces, [(1.5, 2.0, False), (2.0, 6.0, True), (6.0, 7.0, False)])
+
+        # Trims on keyframes have no edge to encode
+        self.assertEqual(FFmpegConcat.smart_cut_plan([0.0, 2.0, 4.0], 0.0, 4.0, 1 / 30), [(0.0, 4.0, True)])
+
+        # Less than one whole GOP inside the trim
+        self.assertIsNone(FFmpegConcat.smart_cut_plan([0.0, 2.0, 4.0], 0.5, 3.0, 1 / 30))
+
+    def test_edges_are_encoded_with_the_source_parameters(self):
+        width, height = self.concat.profile.resolution
+        fps = self.concat.profile.fps
+        with patch("components.video_processing.fast_video_concat.probe_media") as probe:
+            probe.return_value = h264_info(width, height, fps, profile="High", level=40, has_b_frames=1)
+            args = self.concat.edge_encode_args(self.video)
+            self.assertEqual(args[args.index("-profile:v") + 1], "high")
+            self.assertEqual(args[args.index("-level") + 1], "4.0")
+            self.assertEqual(args[args.index("-b-pyramid") + 1], "none")
+
+            # Parameters libx264 cannot reproduce fall back to a full encode
+            probe.return_value = h264_info(width, height, fps, profile="High 10")
+            self.assertIsNone(self.concat.edge_encode_args(self.video))
+            probe.return_value = h264_info(width, height, fps, has_b_frames=None)
+            self.assertIsNone(self.concat.edge_encode_args(self.video))
+            probe.return_value = h264_info(width, height, fps / 2)
+            self.assertIsNone(self.concat.edge_encode_args(self.video))
+
+    @patch("components.video_processing.fast_video_concat.probe_keyframes", return_value=[0.0, 2.0, 4.0])
+    @patch.object(FFmpegConcat, "edge_encode_args", return_value=["-c:v", "libx264"])
+    @patch.object(FFmpegConcat, "_run_ffmpeg", side_effect=fake_ffmpeg)
+    def test_smart_cut_segment(self, mock_run, *_):
+        self.concat.smart_cut = True
+        _, path, duration, _ = self.concat.process_video_segment(self.tmp.name, 0, Segment(self.video, 1, 4))
+        self.assertEqual(duration, 3)
+        self.assertTrue(os.path.exists(path))
+        # Encoded head, copied GOP, then the stitch
+        self.assertEqual(mock_run.call_count, 3)
+        self.assertIn("copy", mock_run.call_args_list[1].args[0])
+        self.assertFalse([f for f in os.listdir(self.tmp.name) if f.startswith("smart_cut")])
+
+    def test_smart_cut_output_decodes(self):
+        ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+        source = os.path.join(self.tmp.name, "gops.mp4")
+        # One second GOPs of a medium preset encode, the edges are encoded with the ultrafast preview preset
+        subprocess.run(
+            [ffmpeg, "-v", "error", "-f", "lavfi", "-i", "testsrc2=size=160x96:rate=30:duration=4"]
+            + [
+                "-c:v",
+                "libx264",
+                "-profile:v",
+                "main",
+                "-g",
+                "30",
+                "-sc_threshold",
+                "0",
+                "-pix_fmt",
+                "yuv420p",
+                source,
+            ],
+            check=True,
+        )
+        profile = replace(RENDER_PROFILES[RenderProfileEnum.PREVIEW], resolution=(160, 96), fps=30)
+        concat = FFmpegConcat(profile=profile, cache_root=self.cache_root, smart_cut=True)
+        concat.jobs = FFmpegJobRunner(binary=ffmpeg)
+
+        # No ffprobe next to the bundled ffmpeg
+        with (
+            patch("components.video_processing.fast_video_concat.probe_media", return_value=h264_info(160, 96, 30)),
+            patch("components.video_processing.fast_video_concat.probe_keyframes", return_value=[0.0, 1.0, 2.0, 3.0]),
+            patch.object(concat, "_run_ffmpeg", wraps=concat._run_ffmpeg) as run,
+        ):
+            _, path, _, _ = concat.process_video_segment(self.tmp.name, 0, Segment(source, 0.5, 3.5))
+        self.assertIsNotNone(path)
+        self.assertIn("copy", run.call_args_list[1].args[0])
+
+        result = subprocess.run(
+            [ffmpeg, "-v", "error", "-i", path, "-fps_mode", "passthrough", "-f", "framemd5", "-"],
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(result.stderr, "")
+        pts = [int(line.split(",")[2]) for line in result.stdout.splitlines() if not line.startswith("#")]
+        # Every frame of the trim once, in order and evenly spaced across both splices
+        self.assertEqual(len(pts), 90)
+        self.assertEqual(pts, list(range(pts[0], pts[0] + 90 * (pts[1] - pts[0]), pts[1] - pts[0])))
+
+    @patch.object(FFmpegConcat, "_run_ffmpeg", side_effect=fake_ffmpeg)
+    def test_concat_and_mux_in_one_invocation(self, mock_run):
+        out_path = os.path.join(self.tmp.name, "preview.mp4")
+        success, duration = self.concat.concat_segments(
+            [Segment(self.video, 0, 2), Segment(self.video, 3, 4)], out_path, [Segment(self.video, 0, 3)]
+        )
+        self.assertTrue(success)
+        self.assertEqual(duration, 3)
+        self.assertTrue(os.path.exists(out_path))
+
+        # Two video trims and one audio trim, then a single join of both lists
+        self.assertEqual(mock_run.call_count, 4)
+        final_args = mock_run.call_args_list[-1].args[0]
+        self.assertEqual(final_args.count("concat"), 2)
+        self.assertIn("+faststart", final_args)
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, "scratch")), [])
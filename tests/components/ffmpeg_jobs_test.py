@@ -0,0 +1,67 @@
+import sys
+import threading
+import time
+import unittest
+
+from components.video_processing.ffmpeg_jobs import FFmpegJobError, FFmpegJobRunner
+
+SLEEP = ["-c", "import time; time.sleep(30)"]
+
+
+class TestFFmpegJobRunner(unittest.TestCase):
+    def test_run_reports_exit_status(self):
+        jobs = FFmpegJobRunner(binary=sys.executable)
+        self.assertTrue(jobs.run(["-c", "pass"]))
+        self.assertFalse(jobs.run(["-c", "raise SystemExit(1)"]))
+
+    def test_timeout_kills_the_process(self):
+        jobs = FFmpegJobRunner(timeout=0.5, binary=sys.executable)
+        started = time.monotonic()
+        self.assertFalse(jobs.run(SLEEP))
+        self.assertLess(time.monotonic() - started, 10)
+
+    def test_cancel_aborts_running_and_new_invocations(self):
+        jobs = FFmpegJobRunner(binary=sys.executable)
+        results = []
+        worker = threading.Thread(target=lambda: results.append(jobs.run(SLEEP)))
+        worker.start()
+        time.sleep(0.5)
+        jobs.cancel()
+        worker.join(timeout=10)
+        self.assertEqual(results, [False])
+        self.assertFalse(jobs.run(["-c", "pass"]))
+
+    def test_map_failure_cancels_the_job(self):
+        jobs = FFmpegJobRunner(binary=sys.executable)
+
+        def step(i):
+            if i == 0:
+                raise FFmpegJobError("segment 0 failed")
+            return jobs.run(SLEEP)
+
+        started = time.monotonic()
+        with self.assertRaises(FFmpegJobError):
+            jobs.map(step, [(0,), (1,)])
+        self.assertTrue(jobs.cancelled)
+        self.assertLess(time.monotonic() - started, 10)
+
+    def test_map_waits_for_running_workers(self):
+        jobs = FFmpegJobRunner(binary=sys.executable)
+        finished = threading.Event()
+
+        def step(i):
+            if i == 0:
+                time.sleep(0.5)
+                raise FFmpegJobError("segment 0 failed")
+            jobs.run(SLEEP)
+            # Still busy after its process was killed, e.g. removing partial output
+            time.sleep(0.5)
+            finished.set()
+
+        with self.assertRaises(FFmpegJobError):
+            jobs.map(step, [(0,), (1,)])
+        self.assertTrue(finished.is_set())
+
+    def test_map_keeps_item_order(self):
+        jobs = FFmpegJobRunner(binary=sys.executable)
+        self.assertEqual(jobs.map(lambda i: i * 2, [(1,), (2,), (3,)], max_workers=2), [2, 4, 6])
@@ -0,0 +1,119 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from dataclasses import replace
+
+import imageio_ffmpeg
+import numpy as np
+from moviepy import VideoClip
+
+from components.video_processing.ffmpeg_render_engine import FFmpegRenderEngine
+from components.video_processing.timeline_compositor import TimelineCompositor
+from utils.data_structures import (
+    RENDER_PROFILES,
+    DataTypeEnum,
+    LoadedVideo,
+    MediaClip,
+    RenderProfileEnum,
+    TransitionTypeEnum,
+)
+
+
+def media_clip(start, end, transition, media_type=DataTypeEnum.VIDEO):
+    return MediaClip(start=start, end=end, transition=transition, type=media_type, video_resampling=0)
+
+
+class TestFFmpegRenderEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = FFmpegRenderEngine(video_preprocessing=object())
+
+    def test_build_command(self):
+        timeline = [
+            ("a.mp4", media_clip(2, 5, TransitionTypeEnum.SLIDE)),
+            ("b.png", media_clip(0, 4, TransitionTypeEnum.FADE, DataTypeEnum.PHOTO)),
+            ("c.mp4", media_clip(1, 3, TransitionTypeEnum.NONE)),
+        ]
+        cmd = self.engine.build_command(timeline, "out.mp4", "libx264", audio_path="song.wav", audio_start=7)
+
+        self.assertEqual(cmd[cmd.index("a.mp4") - 5 : cmd.index("a.mp4")], ["-ss", "2", "-t", "3", "-i"])
+        self.assertIn("-loop", cmd[: cmd.index("b.png")])
+        # 3s + 4s - 1s slide overlap + 2s
+        self.assertEqual(cmd[cmd.index("song.wav") - 5 : cmd.index("song.wav")], ["-ss", "7", "-t", "8", "-i"])
+
+        graph = cmd[cmd.index("-filter_complex") + 1]
+        self.assertIn("[v0][v1]xfade=transition=slideleft:duration=1:offset=2[j1]", graph)
+        self.assertIn("fade=t=out:st=3:d=1[v1]", graph)
+        self.assertIn("fade=t=in:st=0:d=1[v2]", graph)
+        self.assertIn("[j1][v2]concat=n=2:v=1:a=0[vout]", graph)
+        self.assertEqual(cmd[cmd.index("[vout]") + 2], "3:a:0")
+        self.assertEqual(cmd[-1], "out.mp4")
+
+    def test_build_command_single_clip_without_audio(self):
+        cmd = self.engine.build_command([("a.mp4", media_clip(0, 2, TransitionTypeEnum.NONE))], "out.mp4", "libx264")
+        self.assertTrue(cmd[cmd.index("-filter_complex") + 1].endswith("[v0]null[vout]"))
+        self.assertNotIn("-c:a", cmd)
+
+    def test_build_command_uses_profile(self):
+        engine = FFmpegRenderEngine(video_preprocessing=object(), profile=RENDER_PROFILES[RenderProfileEnum.DRAFT])
+        cmd = engine.build_command([("a.mp4", media_clip(0, 2, TransitionTypeEnum.NONE))], "out.mp4", "libx264")
+        self.assertIn("scale=540:960:force_original_aspect_ratio=decrease", cmd[cmd.index("-filter_complex") + 1])
+        self.assertEqual(cmd[cmd.index("-preset") + 1], "ultrafast")
+        self.assertEqual(cmd[cmd.index("-crf") + 1], "28")
+
+    def test_transition_graph_runs(self):
+        ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+        profile = replace(RENDER_PROFILES[RenderProfileEnum.DRAFT], resolution=(90, 160))
+        engine = FFmpegRenderEngine(video_preprocessing=object(), profile=profile)
+        with tempfile.TemporaryDirectory() as tmp:
+            clip = os.path.join(tmp, "clip.mp4")
+            subprocess.run(
+                [ffmpeg, "-v", "error", "-f", "lavfi", "-i", "testsrc=size=160x90:rate=25:duration=3", clip],
+                check=True,
+            )
+            timeline = [
+                (clip, media_clip(0, 2, TransitionTypeEnum.SLIDE)),
+                (clip, media_clip(0, 2, TransitionTypeEnum.ZOOM)),
+                (clip, media_clip(0, 2, TransitionTypeEnum.SPIN)),
+                (clip, media_clip(0, 2, TransitionTypeEnum.NONE)),
+            ]
+            output = os.path.join(tmp, "out.mp4")
+            cmd = engine.build_command(timeline, output, "libx264")
+            result = subprocess.run([ffmpeg, *cmd[1:]], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            self.assertEqual(result.returncode, 0, result.stderr[-500:])
+            self.assertGreater(os.path.getsize(output), 0)
+
+    def test_short_clip_between_transitions_matches_moviepy_duration(self):
+        # The 0.6s middle clip gives each of its slides half of its length, as in TimelineCompositor
+        ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+        profile = replace(RENDER_PROFILES[RenderProfileEnum.DRAFT], resolution=(90, 160))
+        engine = FFmpegRenderEngine(video_preprocessing=object(), profile=profile)
+        entries = [
+            media_clip(0, 2, TransitionTypeEnum.SLIDE),
+            media_clip(0, 0.6, TransitionTypeEnum.SLIDE),
+            media_clip(0, 2, TransitionTypeEnum.NONE),
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            clip = os.path.join(tmp, "clip.mp4")
+            subprocess.run(
+                [ffmpeg, "-v", "error", "-f", "lavfi", "-i", "testsrc=size=160x90:rate=30:duration=3", clip],
+                check=True,
+            )
+            output = os.path.join(tmp, "out.mp4")
+            cmd = engine.build_command([(clip, entry) for entry in entries], output, "libx264")
+            subprocess.run([ffmpeg, *cmd[1:]], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            frames = subprocess.run(
+                [ffmpeg, "-v", "error", "-i", output, "-f", "framemd5", "-"], capture_output=True, text=True
+            ).stdout
+        rendered = len([line for line in frames.splitlines() if not line.startswith("#")]) / profile.fps
+
+        frame = np.zeros((160, 90, 3), dtype=np.uint8)
+        composed = TimelineCompositor(fps=profile.fps).compose(
+            [
+                LoadedVideo(
+                    clip=VideoClip(lambda t: frame, duration=entry.end - entry.start), transition=entry.transition
+                )
+                for entry in entries
+            ]
+        )
+        self.assertAlmostEqual(rendered, composed.duration, delta=1 / profile.fps)
@@ -0,0 +1,78 @@
+import json
+import os
+from unittest.mock import patch
+
+from components.video_processing.media_probe import KeyframeIndex, MediaProbe
+from tests.conftest import MediaTestCase
+
+FFPROBE_OUTPUT = {
+    "streams": [
+        {
+            "codec_type": "video",
+            "codec_name": "hevc",
+            "pix_fmt": "yuv420p10le",
+            "profile": "Main 10",
+            "level": 153,
+            "has_b_frames": 2,
+            "width": 3840,
+            "height": 2160,
+            "r_frame_rate": "30/1",
+            "avg_frame_rate": "30000/1001",
+            "side_data_list": [{"side_data_type": "Display Matrix", "rotation": -90}],
+        },
+        {"codec_type": "audio", "codec_name": "aac"},
+    ],
+    "format": {"duration": "12.5"},
+}
+
+
+class TestMediaProbe(MediaTestCase):
+    VIDEO_NAME = "clip.mov"
+
+    def test_parse(self):
+        info = MediaProbe.parse(FFPROBE_OUTPUT)
+        self.assertEqual(info.duration, 12.5)
+        self.assertEqual((info.width, info.height), (3840, 2160))
+        self.assertEqual(info.rotation, 270)
+        self.assertEqual(info.video_codec, "hevc")
+        self.assertEqual((info.video_profile, info.video_level, info.has_b_frames), ("Main 10", 153, 2))
+        self.assertTrue(info.has_audio)
+        self.assertTrue(info.is_variable_framerate)
+
+    @patch("subprocess.check_output", return_value=json.dumps(FFPROBE_OUTPUT).encode())
+    def test_probe_is_memoized_on_disk(self, mock_check):
+        first = MediaProbe(cache_root=self.tmp.name).probe(self.video)
+        second = MediaProbe(cache_root=self.tmp.name).probe(self.video)
+
+        self.assertEqual(first, second)
+        mock_check.assert_called_once()
+
+        # A modified file is probed again
+        with open(self.video, "ab") as f:
+            f.write(b"more")
+        MediaProbe(cache_root=self.tmp.name).probe(self.video)
+        self.assertEqual(mock_check.call_count, 2)
+
+    @patch("subprocess.check_output", return_value=json.dumps(FFPROBE_OUTPUT).encode())
+    def test_stale_index_entry_is_probed_again(self, mock_check):
+        probe = MediaProbe(cache_root=self.tmp.name)
+        with open(probe.index_path, "w") as f:
+            json.dump({probe._index_key(self.video): {"duration": 1.0, "fps": 30}}, f)
+
+        self.assertEqual(probe.probe(self.video), MediaProbe.parse(FFPROBE_OUTPUT))
+        mock_check.assert_called_once()
+
+    def test_probe_missing_file(self):
+        self.assertIsNone(MediaProbe(cache_root=self.tmp.name).probe(os.path.join(self.tmp.name, "missing.mp4")))
+
+    def test_parse_keyframes(self):
+        output = {
+            "packets": [
+                {"pts_time": "1.400000", "flags": "K__"},
+                {"pts_time": "1.433333", "flags": "___"},
+                {"pts_time": "3.400000", "flags": "K__"},
+                {"pts_time": "N/A", "flags": "K__"},
+            ],
+            "format": {"start_time": "1.400000"},
+        }
+        self.assertEqual(KeyframeIndex.parse(output), [0.0, 2.0])
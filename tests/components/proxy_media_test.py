@@ -0,0 +1,36 @@
+import os
+from unittest.mock import patch
+
+from components.video_processing.proxy_media import ProxyMedia
+from components.video_processing.video_processing_utils import CommandRunner
+from tests.conftest import MediaTestCase, fake_ffmpeg
+
+
+class TestProxyMedia(MediaTestCase):
+    VIDEO_NAME = "clip.mov"
+
+    def setUp(self):
+        super().setUp()
+        self.proxy_media = ProxyMedia(cache_root=self.cache_root)
+
+    @patch.object(CommandRunner, "run", side_effect=fake_ffmpeg)
+    def test_generate_once(self, mock_run):
+        self.assertIsNone(self.proxy_media.get(self.video))
+        self.assertEqual(self.proxy_media.resolve(self.video), self.video)
+
+        proxy_path = self.proxy_media.generate(self.video)
+        self.assertEqual(self.proxy_media.generate(self.video), proxy_path)
+        self.assertEqual(self.proxy_media.resolve(self.video), proxy_path)
+        mock_run.assert_called_once()
+        self.assertIn("-an", mock_run.call_args.args[0])
+
+    @patch.object(CommandRunner, "run", side_effect=fake_ffmpeg)
+    def test_start_in_background(self, mock_run):
+        self.proxy_media.start([self.video, self.video])
+        self.proxy_media.wait(timeout=10)
+        self.assertFalse(self.proxy_media.is_running())
+        self.assertIsNotNone(self.proxy_media.get(self.video))
+        mock_run.assert_called_once()
+
+    def test_missing_source(self):
+        self.assertIsNone(self.proxy_media.get(os.path.join(self.tmp.name, "missing.mov")))
@@ -0,0 +1,72 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from components.video_processing.transition_kernels import (
+    SlideKernel,
+    get_warp_plan,
+    warp_into,
+)
+from utils.data_structures import TransitionTypeEnum
+
+
+def reference_slide_frame(i, transition_frames, frame1, frame2, blend_width):
+    """Per-column loop the kernel replaces."""
+    w = frame1.shape[1]
+    x_offset = int(w * (1 - i / transition_frames))
+    frame = np.zeros_like(frame1)
+    if x_offset > blend_width:
+        frame[:, : x_offset - blend_width] = frame1[:, w - x_offset + blend_width : w]
+    if x_offset + blend_width < w:
+        frame[:, x_offset + blend_width :] = frame2[:, : w - (x_offset + blend_width)]
+    if 0 < x_offset < w:
+        for bw in range(blend_width):
+            alpha = bw / blend_width
+            col1 = w - x_offset + bw
+            col2 = x_offset - blend_width + bw
+            if 0 <= col1 < w and 0 <= col2 < w:
+                frame[:, col2] = (frame1[:, col1] * (1 - alpha) + frame2[:, col2] * alpha).astype(np.uint8)
+    return frame
+
+
+class TestSlideKernel(unittest.TestCase):
+    def test_matches_reference(self):
+        rng = np.random.default_rng(0)
+        frame1 = rng.integers(0, 256, (6, 40, 3), dtype=np.uint8)
+        frame2 = rng.integers(0, 256, (6, 40, 3), dtype=np.uint8)
+        for blend_width in (0, 1, 7, 25):
+            kernel = SlideKernel(40, 12, blend_width)
+            for i in range(12):
+                with self.subTest(blend_width=blend_width, i=i):
+                    np.testing.assert_array_equal(
+                        kernel.render(i, frame1, frame2),
+                        reference_slide_frame(i, 12, frame1, frame2, blend_width),
+                    )
+
+    def test_reuses_output_buffer(self):
+        frame = np.zeros((4, 8, 3), dtype=np.uint8)
+        kernel = SlideKernel(8, 4, 2)
+        self.assertIs(kernel.render(0, frame, frame), kernel.render(1, frame, frame))
+
+
+class TestWarpPlan(unittest.TestCase):
+    def test_spin_plan_matches_rotation(self):
+        frame = np.random.default_rng(0).integers(0, 256, (20, 12, 3), dtype=np.uint8)
+        plan = get_warp_plan(TransitionTypeEnum.SPIN, (12, 20), 8)
+        self.assertIs(plan, get_warp_plan(TransitionTypeEnum.SPIN, (12, 20), 8))
+        matrix = cv2.getRotationMatrix2D((6, 10), 360 * 3 / 8, 1.0)
+        np.testing.assert_array_equal(
+            warp_into(frame, plan[3, 0], np.empty_like(frame)),
+            cv2.warpAffine(frame, matrix, (12, 20)),
+        )
+
+    def test_zoom_plan_keeps_center(self):
+        plan = get_warp_plan(TransitionTypeEnum.ZOOM, (12, 20), 4, "in")
+        for i in range(4):
+            with self.subTest(i=i):
+                np.testing.assert_allclose(plan[i, 0] @ [6, 10, 1], [6, 10])
+
+    def test_rejects_other_transitions(self):
+        with self.assertRaises(ValueError):
+            get_warp_plan(TransitionTypeEnum.FADE, (12, 20), 4)
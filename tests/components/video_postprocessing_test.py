@@ -1,8 +1,24 @@
+import os
+import tempfile
 import unittest
-from unittest.mock import MagicMock, call, patch
+from unittest.mock import MagicMock, patch
 
+import numpy as np
+from moviepy import VideoClip
+
+from components.video_processing.preprocessing_prewarm import PreprocessingPrewarmer
+from components.video_processing.video_postprocessing import VideoPostProcessing
 from components.video_processing.video_preprocessing import VideoPreprocessing
-from utils.data_structures import DataTypeEnum, LoadedVideo, MediaClip
+from tests.conftest import fake_ffmpeg
+from utils.data_structures import (
+    RENDER_PROFILES,
+    DataTypeEnum,
+    LoadedVideo,
+    MediaClip,
+    MediaInfo,
+    RenderProfileEnum,
+    TransitionTypeEnum,
+)
 
 
 class TestVideoPreprocessing(unittest.TestCase):
@@ -12,62 +28,118 @@ class TestVideoPreprocessing(unittest.TestCase):
         self.media_dir = "/media"
         self.file_path = "video.mp4"
 
-    @patch("os.remove")
-    def test_cleanup_temp_files(self, mock_remove):
-        # Add temp files
-        self.vp.temp_cfr_files = ["file1.mp4", "file2.mp4"]
-
-        self.vp.cleanup_temp_files()
-        mock_remove.assert_has_calls([call("file1.mp4"), call("file2.mp4")])
+    def test_convert_to_cfr_new_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            input_path = os.path.join(tmp, "video.mp4")
+            with open(input_path, "wb") as f:
+                f.write(b"vfr video")
+            vp = VideoPreprocessing(cache_root=os.path.join(tmp, "cache"))
 
-    @patch("subprocess.run")
-    @patch("os.path.exists", return_value=False)
-    @patch("os.makedirs")
-    def test_convert_to_cfr_new_file(self, mock_makedirs, mock_exists, mock_run):
-        input_path = "video.mp4"
-        output = self.vp.convert_to_cfr(input_path, target_fps=24)
+            with patch.object(VideoPreprocessing, "_run_command", side_effect=fake_ffmpeg) as mock_run:
+                output = vp.convert_to_cfr(input_path, target_fps=24)
 
-        # Check subprocess run called with ffmpeg
-        self.assertIn("_cfr_24fps.mp4", output)
-        mock_run.assert_called_once()
+            mock_run.assert_called_once()
+            self.assertIn("24", mock_run.call_args[0][0])
+            self.assertTrue(output.startswith(vp.transcode_cache.directory))
+            self.assertTrue(os.path.exists(output))
+            self.assertEqual(vp.cfr_cache[(input_path, 24, None)], output)
 
-        # Check caches updated
-        self.assertIn(input_path, self.vp.cfr_cache)
-        self.assertIn(output, self.vp.temp_cfr_files)
-
-    @patch("os.path.exists", return_value=True)
-    def test_convert_to_cfr_cached_file(self, mock_exists):
+    def test_convert_to_cfr_cached_file(self):
         input_path = "video.mp4"
         # Pre-fill cache
         cached_path = "temp/video_cfr_30fps.mp4"
-        self.vp.cfr_cache[input_path] = cached_path
+        self.vp.cfr_cache[(input_path, 30, None)] = cached_path
 
         result = self.vp.convert_to_cfr(input_path)
         self.assertEqual(result, cached_path)
 
-    @patch("subprocess.check_output")
-    def test_is_variable_framerate_var(self, mock_check):
+    def test_convert_to_cfr_shared_across_runs_and_keyed_by_content(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_root = os.path.join(tmp, "cache")
+            for folder, content in (("a", b"first"), ("b", b"second")):
+                os.makedirs(os.path.join(tmp, folder))
+                with open(os.path.join(tmp, folder, "IMG_0001.MOV"), "wb") as f:
+                    f.write(content)
+
+            with patch.object(VideoPreprocessing, "_run_command", side_effect=fake_ffmpeg) as mock_run:
+                first = VideoPreprocessing(cache_root=cache_root).convert_to_cfr(os.path.join(tmp, "a", "IMG_0001.MOV"))
+                other = VideoPreprocessing(cache_root=cache_root).convert_to_cfr(os.path.join(tmp, "b", "IMG_0001.MOV"))
+                again = VideoPreprocessing(cache_root=cache_root).convert_to_cfr(os.path.join(tmp, "a", "IMG_0001.MOV"))
+
+            self.assertNotEqual(first, other)
+            self.assertEqual(first, again)
+            self.assertEqual(mock_run.call_count, 2)
+
+    @staticmethod
+    def _media_info(r_fps, avg_fps, duration=10.0):
+        return MediaInfo(
+            duration=duration,
+            width=1080,
+            height=1920,
+            r_fps=r_fps,
+            avg_fps=avg_fps,
+            rotation=0,
+            video_codec="h264",
+            pix_fmt="yuv420p",
+            audio_codec=None,
+        )
+
+    def test_convert_to_cfr_only_transcodes_window(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            input_path = os.path.join(tmp, "video.mp4")
+            with open(input_path, "wb") as f:
+                f.write(b"vfr video")
+            vp = VideoPreprocessing(
+                cache_root=os.path.join(tmp, "cache"), profile=RENDER_PROFILES[RenderProfileEnum.DRAFT]
+            )
+
+            with patch.object(VideoPreprocessing, "_run_command", side_effect=fake_ffmpeg) as mock_run:
+                first = vp.convert_to_cfr(input_path, 30, window=vp.cfr_window(60, 63))
+                second = vp.convert_to_cfr(input_path, 30, window=vp.cfr_window(10, 13))
+
+            cmd = mock_run.call_args_list[0][0][0]
+            self.assertEqual(cmd[1:5], ["-ss", "59.5", "-t", "4.0"])
+            self.assertEqual(cmd[cmd.index("-preset") + 1], "ultrafast")
+            self.assertNotEqual(first, second)
+
+    @patch("components.video_processing.video_preprocessing.probe_media")
+    def test_is_variable_framerate_var(self, mock_probe):
         # r_frame_rate != avg_frame_rate
-        mock_check.return_value = b"30000/1001\n29.97/1\n"
+        mock_probe.return_value = self._media_info(30000 / 1001, 29.97)
         is_var, avg = self.vp.is_variable_framerate("file.mp4")
         self.assertTrue(is_var)
         self.assertEqual(avg, 29)
 
-    @patch("subprocess.check_output")
-    def test_is_variable_framerate_non_var(self, mock_check):
-        mock_check.return_value = b"30/1\n30/1\n"
+    @patch("components.video_processing.video_preprocessing.probe_media")
+    def test_is_variable_framerate_non_var(self, mock_probe):
+        mock_probe.return_value = self._media_info(30.0, 30.0)
         is_var, avg = self.vp.is_variable_framerate("file.mp4")
         self.assertFalse(is_var)
         self.assertEqual(avg, 30)
 
+    @patch("components.video_processing.video_preprocessing.probe_media")
+    def test_is_variable_framerate_unknown_average(self, mock_probe):
+        # avg_frame_rate 0/0 falls back to the nominal rate instead of transcoding with -r 0
+        mock_probe.return_value = self._media_info(30.0, 0.0)
+        self.assertEqual(self.vp.is_variable_framerate("file.mp4"), (False, 30))
+
+        mock_probe.return_value = self._media_info(0.0, 0.0)
+        self.assertEqual(self.vp.is_variable_framerate("file.mp4"), (False, None))
+
+    @patch("components.video_processing.video_preprocessing.probe_media", return_value=None)
+    def test_is_variable_framerate_probe_failure(self, mock_probe):
+        self.assertEqual(self.vp.is_variable_framerate("file.mp4"), (False, None))
+
+    @patch("components.video_processing.video_preprocessing.probe_media")
     @patch("components.video_processing.video_preprocessing.VideoFileClip")
     @patch("components.video_processing.video_preprocessing.format_photo_to_vertical")
-    def test_process_entry_video(self, mock_format, mock_videoclip):
+    def test_process_entry_video(self, mock_format, mock_videoclip, mock_probe):
         # Setup
         clip_mock = MagicMock()
         clip_mock.duration = 10
         clip_mock.subclip.return_value = clip_mock
         mock_videoclip.return_value = clip_mock
+        mock_probe.return_value = self._media_info(30.0, 30.0, duration=10.0)
 
         entry = MediaClip(type=DataTypeEnum.VIDEO.value, start=0, end=5, video_resampling=True, transition=None)
 
@@ -99,3 +171,126 @@ class TestVideoPreprocessing(unittest.TestCase):
 
         with self.assertRaises(ValueError):
             self.vp.process_entry(self.file_path, entry, self.media_dir)
+
+    def test_process_entries_keeps_config_order_and_reports_failures(self):
+        entries = {
+            "a.mp4": MediaClip(type=DataTypeEnum.VIDEO.value, start=0, end=1, video_resampling=False, transition=None),
+            "b.mp4": MediaClip(type=DataTypeEnum.VIDEO.value, start=0, end=1, video_resampling=False, transition=None),
+            "c.mp4": MediaClip(type=DataTypeEnum.VIDEO.value, start=0, end=1, video_resampling=False, transition=None),
+        }
+
+        def fake_process_entry(file_path, entry, media_dir):
+            if file_path == "b.mp4":
+                raise RuntimeError("broken file")
+            return LoadedVideo(clip=file_path)
+
+        with patch.object(self.vp, "process_entry", side_effect=fake_process_entry):
+            results = self.vp.process_entries(entries, self.media_dir, max_workers=3)
+
+        self.assertEqual([name for name, _ in results], ["a.mp4", "b.mp4", "c.mp4"])
+        self.assertEqual(results[0][1].clip, "a.mp4")
+        self.assertIsNone(results[1][1])
+        self.assertEqual(results[2][1].clip, "c.mp4")
+
+    @patch("components.video_processing.video_preprocessing.probe_media")
+    def test_prewarm_entry_converts_referenced_window(self, mock_probe):
+        mock_probe.return_value = self._media_info(30000 / 1001, 29.97)
+        entry = MediaClip(type=DataTypeEnum.VIDEO.value, start=4, end=6, video_resampling=1, transition=None)
+
+        with patch.object(self.vp, "convert_to_cfr", return_value="cfr.mp4") as mock_convert:
+            self.vp.prewarm_entry(self.file_path, entry, self.media_dir)
+
+        mock_convert.assert_called_once_with(os.path.join(self.media_dir, self.file_path), 29, (3.5, 6.5))
+
+    def test_prewarm_uses_the_render_profile(self):
+        entry = MediaClip(type=DataTypeEnum.VIDEO.value, start=0, end=1, video_resampling=1, transition=None)
+        prewarmer = PreprocessingPrewarmer()
+        with patch.object(VideoPreprocessing, "prewarm_entry", autospec=True) as mock_prewarm:
+            prewarmer.start({"a.mp4": entry}, self.media_dir, RENDER_PROFILES[RenderProfileEnum.DRAFT])
+            prewarmer.wait(timeout=10)
+
+        video_preprocessing = mock_prewarm.call_args.args[0]
+        self.assertEqual(video_preprocessing.profile, RENDER_PROFILES[RenderProfileEnum.DRAFT])
+
+    @patch("components.video_processing.video_preprocessing.format_photo_to_vertical")
+    def test_load_vertical_photo_cached_on_disk(self, mock_format):
+        mock_format.return_value = np.full((1920, 1080, 3), 7, dtype=np.uint8)
+        with tempfile.TemporaryDirectory() as tmp:
+            photo_path = os.path.join(tmp, "photo.jpg")
+            with open(photo_path, "wb") as f:
+                f.write(b"jpeg")
+            cache_root = os.path.join(tmp, "cache")
+
+            first = VideoPreprocessing(cache_root=cache_root).load_vertical_photo(photo_path)
+            second = VideoPreprocessing(cache_root=cache_root).load_vertical_photo(photo_path)
+
+            mock_format.assert_called_once()
+            self.assertIsInstance(second, np.memmap)
+            np.testing.assert_array_equal(first, second)
+            del first, second
+
+
+class TestVideoPostProcessing(unittest.TestCase):
+    def test_is_still_clip(self):
+        frame = np.zeros((4, 4, 3), dtype=np.uint8)
+        clips = [
+            LoadedVideo(clip=MagicMock(), transition=TransitionTypeEnum.NONE, still_frame=frame),
+            LoadedVideo(clip=MagicMock(), transition=TransitionTypeEnum.FADE, still_frame=frame),
+            LoadedVideo(clip=MagicMock(), transition=TransitionTypeEnum.NONE, still_frame=frame),
+            LoadedVideo(clip=MagicMock(), transition=TransitionTypeEnum.NONE),
+            LoadedVideo(clip=MagicMock(), transition=TransitionTypeEnum.SLIDE, still_frame=frame),
+        ]
+        self.assertEqual(
+            [VideoPostProcessing.is_still_clip(clips, i) for i in range(len(clips))],
+            [True, False, False, False, True],
+        )
+
+    def test_resize_and_center(self):
+        frame = np.full((40, 80, 3), 200, dtype=np.uint8)
+        clip = VideoClip(lambda t: frame, duration=1)
+        loaded = VideoPostProcessing.resize_and_center(LoadedVideo(clip=clip), target_size=(30, 60))
+        out = loaded.clip.get_frame(0)
+        self.assertEqual(tuple(loaded.clip.size), (30, 60))
+        # 80x40 becomes 30x15 centered vertically between black bars
+        np.testing.assert_array_equal(out[:22], 0)
+        np.testing.assert_array_equal(out[22:37], 200)
+        np.testing.assert_array_equal(out[37:], 0)
+
+        same_size = LoadedVideo(clip=clip)
+        self.assertIs(VideoPostProcessing.resize_and_center(same_size, target_size=(80, 40)).clip, clip)
+
+    def test_split_chunks(self):
+        transitions = [
+            TransitionTypeEnum.SLIDE,
+            TransitionTypeEnum.NONE,
+            TransitionTypeEnum.NONE,
+            TransitionTypeEnum.FADE,
+            TransitionTypeEnum.ZOOM,
+        ]
+        clips = [LoadedVideo(clip=MagicMock(), transition=transition) for transition in transitions]
+        self.assertEqual(
+            VideoPostProcessing.split_chunks(clips),
+            [clips[:2], clips[2:3], clips[3:]],
+        )
+
+    @patch("components.video_processing.video_postprocessing.concat_video_parts")
+    @patch("components.video_processing.video_postprocessing.get_codec", return_value="libx264")
+    def test_preview_joins_parts_by_stream_copy(self, _, mock_concat):
+        vpp = VideoPostProcessing()
+        frame = np.zeros((1920, 1080, 3), dtype=np.uint8)
+        clips = [LoadedVideo(clip=VideoClip(lambda t: frame, duration=d)) for d in (1, 2)]
+        with tempfile.TemporaryDirectory() as tmp:
+            vpp.PREVIEW_FOLDER = tmp
+
+            def fake_render(index, clip, codec):
+                open(vpp.preview_file(index), "wb").close()
+
+            with patch.object(vpp, "render_clip", side_effect=fake_render):
+                vpp.preview(clips, audio_path="song.mp3", audio_start=4)
+            mock_concat.assert_called_once_with(
+                [vpp.preview_file(1), vpp.preview_file(2)],
+                os.path.join(tmp, "preview_fast.mp4"),
+                "song.mp3",
+                4,
+                3,
+            )
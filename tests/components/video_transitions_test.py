@@ -0,0 +1,118 @@
+import unittest
+
+import numpy as np
+from moviepy import VideoClip
+
+from components.video_processing.timeline_compositor import TimelineCompositor
+from components.video_processing.video_transitions import VideoTransitions
+from utils.data_structures import LoadedVideo, TransitionTypeEnum
+from utils.tracing import trace_run
+
+
+def color_clip(color, duration, size=(8, 6)):
+    frame = np.full((size[1], size[0], 3), color, dtype=np.uint8)
+    return VideoClip(lambda t: frame, duration=duration).with_fps(10)
+
+
+class TestVideoTransitions(unittest.TestCase):
+    def setUp(self):
+        self.transitions = VideoTransitions()
+        self.clip1 = color_clip((255, 0, 0), duration=2)
+        self.clip2 = color_clip((0, 0, 255), duration=3)
+
+    def test_overlap_transitions_only_shorten_by_window(self):
+        for name in ("slide_transition", "spin_transition", "zoom_transition"):
+            with self.subTest(name):
+                clip = getattr(self.transitions, name)(self.clip1, self.clip2, duration=1, fps=10)
+                self.assertAlmostEqual(clip.duration, 4)
+                np.testing.assert_array_equal(clip.get_frame(0.5)[0, 0], [255, 0, 0])
+                np.testing.assert_array_equal(clip.get_frame(3.5)[0, 0], [0, 0, 255])
+
+    def test_slide_window_frames(self):
+        clip = self.transitions.slide_transition(self.clip1, self.clip2, duration=1, fps=10)
+        # Half way through the window clip1 covers the left half and clip2 the right half
+        frame = clip.get_frame(1.5)
+        np.testing.assert_array_equal(frame[:, :4], np.broadcast_to([255, 0, 0], (6, 4, 3)))
+        np.testing.assert_array_equal(frame[:, 4:], np.broadcast_to([0, 0, 255], (6, 4, 3)))
+
+    def test_transition_window_records_one_span(self):
+        with trace_run() as tracer:
+            clip = self.transitions.spin_transition(self.clip1, self.clip2, duration=1, fps=10)
+            for t in np.arange(0, clip.duration, 0.1):
+                clip.get_frame(t)
+        spans = [event for event in tracer.events() if event["name"].startswith("transition")]
+        self.assertEqual([event["name"] for event in spans], ["transition_window"])
+        self.assertEqual(spans[0]["args"], {"frames": "10"})
+
+    def test_spin_and_zoom_frames_reuse_buffers(self):
+        frame1 = np.full((6, 8, 3), 200, dtype=np.uint8)
+        frame2 = np.full((6, 8, 3), 100, dtype=np.uint8)
+        for blend_frame in (self.transitions.spin_frame, self.transitions.zoom_blend_frame):
+            with self.subTest(blend_frame.__name__):
+                first = blend_frame(0, 4, frame1, frame2)
+                np.testing.assert_array_equal(first[3, 4], [200, 200, 200])
+                self.assertIs(blend_frame(2, 4, frame1, frame2), first)
+
+
+class TestTimelineCompositor(unittest.TestCase):
+    def test_compose_matches_chained_transitions(self):
+        colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255)]
+        kinds = [TransitionTypeEnum.SLIDE, TransitionTypeEnum.FADE, TransitionTypeEnum.ZOOM, TransitionTypeEnum.NONE]
+        clips = [LoadedVideo(clip=color_clip(color, duration=2), transition=kind) for color, kind in zip(colors, kinds)]
+
+        composed = TimelineCompositor(fps=10).compose(clips)
+
+        transitions = VideoTransitions()
+        chained = clips[0].clip
+        for i in range(1, len(clips)):
+            kind = clips[i - 1].transition
+            if kind in transitions.blend_frames:
+                chained = transitions.transitions[kind](chained, clips[i].clip, duration=1, fps=10)
+            else:
+                chained = transitions.transitions[kind](chained, clips[i].clip, duration=1)
+
+        self.assertAlmostEqual(composed.duration, 6)
+        self.assertAlmostEqual(composed.duration, chained.duration)
+        for t in np.arange(0, 6, 0.1):
+            np.testing.assert_array_equal(composed.get_frame(t), chained.get_frame(t))
+
+    def test_compose_short_clip_between_transitions(self):
+        # The 1s middle clip is shorter than its two 1s windows together, each window gets half of it
+        def ramp(t):
+            return np.full((6, 8, 3), round(t * 10) * 20, dtype=np.uint8)
+
+        clips = [
+            LoadedVideo(clip=color_clip((255, 0, 0), duration=2), transition=TransitionTypeEnum.SLIDE),
+            LoadedVideo(clip=VideoClip(ramp, duration=1).with_fps(10), transition=TransitionTypeEnum.SLIDE),
+            LoadedVideo(clip=color_clip((0, 0, 255), duration=2), transition=TransitionTypeEnum.NONE),
+        ]
+        composed = TimelineCompositor(fps=10).compose(clips)
+
+        transitions = VideoTransitions()
+        chained = transitions.slide_transition(clips[0].clip, clips[1].clip, duration=0.5, fps=10)
+        chained = transitions.slide_transition(chained, clips[2].clip, duration=0.5, fps=10)
+
+        self.assertAlmostEqual(composed.duration, 4)
+        for t in np.arange(0, 4, 0.1):
+            np.testing.assert_array_equal(composed.get_frame(t), chained.get_frame(t))
+
+    def test_fade_into_warped_transition(self):
+        # The fade leaves float frames in the head of the 1.5s clip, inside the window of the next transition
+        for kind in (TransitionTypeEnum.SPIN, TransitionTypeEnum.ZOOM):
+            with self.subTest(kind):
+                clips = [
+                    LoadedVideo(clip=color_clip((255, 0, 0), duration=2), transition=TransitionTypeEnum.FADE),
+                    LoadedVideo(clip=color_clip((0, 255, 0), duration=1.5), transition=kind),
+                    LoadedVideo(clip=color_clip((0, 0, 255), duration=2), transition=TransitionTypeEnum.NONE),
+                ]
+                composed = TimelineCompositor(fps=10).compose(clips)
+
+                transitions = VideoTransitions()
+                chained = transitions.fade_transition(clips[0].clip, clips[1].clip, duration=1)
+                chained = transitions.transitions[kind](chained, clips[2].clip, duration=1, fps=10)
+
+                self.assertAlmostEqual(composed.duration, 4.5)
+                for t in np.arange(0, 4.5, 0.1):
+                    # Fade factors of the two paths differ by float error in t
+                    np.testing.assert_allclose(composed.get_frame(t), chained.get_frame(t), atol=1)
+                self.assertEqual(composed.get_frame(2.6).dtype, np.uint8)
@@ -0,0 +1,33 @@
+"""Fixtures and helpers shared by the test modules."""
+
+import os
+import tempfile
+import unittest
+
+
+def fake_ffmpeg(cmd, **kwargs):
+    """Stand-in for an ffmpeg run: writes a placeholder to the output path, the last argument."""
+    with open(cmd[-1], "wb") as f:
+        f.write(b"encoded")
+    return True
+
+
+class MediaTestCase(unittest.TestCase):
+    """Test case with a scratch directory holding a placeholder video and the cache root."""
+
+    VIDEO_NAME = "clip.mp4"
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_root = os.path.join(self.tmp.name, "cache")
+        self.video = self.make_file(self.VIDEO_NAME, b"video")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_file(self, name, content=b"media"):
+        path = os.path.join(self.tmp.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
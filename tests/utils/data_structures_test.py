@@ -3,7 +3,12 @@ from __future__ import annotations
 import unittest
 from dataclasses import fields
 
-from utils.data_structures import MediaClip
+from utils.data_structures import (
+    RENDER_PROFILES,
+    EncoderCapabilities,
+    MediaClip,
+    RenderProfileEnum,
+)
 
 
 class TestMediaClipFieldOrder(unittest.TestCase):
@@ -17,3 +22,25 @@ class TestMediaClipFieldOrder(unittest.TestCase):
         ]
         actual_order = [field.name for field in fields(MediaClip)]
         self.assertEqual(actual_order, expected_order)
+
+
+class TestRenderProfile(unittest.TestCase):
+    def test_preset_follows_the_encoder(self):
+        draft = RENDER_PROFILES[RenderProfileEnum.DRAFT]
+        self.assertEqual(draft.video_args("libx264")[:4], ["-c:v", "libx264", "-preset", "ultrafast"])
+        self.assertEqual(draft.video_args("h264_nvenc")[:4], ["-c:v", "h264_nvenc", "-preset", "p1"])
+        self.assertEqual(draft.write_videofile_kwargs("h264_nvenc")["preset"], "p1")
+        # No equivalent preset name: the encoder default is kept
+        self.assertNotIn("-preset", draft.video_args("h264_videotoolbox"))
+        self.assertNotIn("preset", draft.write_videofile_kwargs("h264_videotoolbox"))
+
+
+class TestEncoderCapabilities(unittest.TestCase):
+    def test_fast_preset_from_benchmark(self):
+        preset_fps = {"ultrafast": 300.0, "superfast": 290.0, "veryfast": 200.0, "medium": 80.0}
+        capabilities = EncoderCapabilities(ffmpeg="", encoders={}, presets={}, preset_fps=preset_fps)
+        self.assertEqual(capabilities.ranked_presets(), ["ultrafast", "superfast", "veryfast", "medium"])
+        # superfast is within 10% of ultrafast here, veryfast is not
+        self.assertEqual(capabilities.fast_preset("ultrafast"), "superfast")
+        self.assertEqual(capabilities.fast_preset("medium"), "medium")
+        self.assertEqual(capabilities.fast_preset("slow"), "slow")
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import time
+import unittest
+
+from utils.media_cache import DiskCache, cache_key, file_fingerprint
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = DiskCache("test", max_bytes=10, root=self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _put(self, key, payload):
+        temp_path = self.cache.temp_path_for(key, ".bin")
+        with open(temp_path, "wb") as f:
+            f.write(payload)
+        return self.cache.commit(temp_path, key, ".bin")
+
+    def test_get_returns_committed_entry(self):
+        self.assertIsNone(self.cache.get("a", ".bin"))
+        path = self._put("a", b"1234")
+        self.assertEqual(self.cache.get("a", ".bin"), path)
+
+    def test_evicts_least_recently_used_over_budget(self):
+        self._put("a", b"1234")
+        self._put("b", b"1234")
+        old = time.time() - 100
+        os.utime(self.cache.path_for("b", ".bin"), (old, old))
+        os.utime(self.cache.path_for("a", ".bin"), (old + 1, old + 1))
+
+        self._put("c", b"1234")
+
+        self.assertIsNone(self.cache.get("b", ".bin"))
+        self.assertIsNotNone(self.cache.get("a", ".bin"))
+        self.assertIsNotNone(self.cache.get("c", ".bin"))
+
+    def test_fingerprint_depends_on_content_not_name(self):
+        paths = []
+        for name, payload in (("x.mov", b"same"), ("y.mov", b"same"), ("z.mov", b"other")):
+            path = os.path.join(self.tmp.name, name)
+            with open(path, "wb") as f:
+                f.write(payload)
+            paths.append(path)
+        self.assertEqual(file_fingerprint(paths[0]), file_fingerprint(paths[1]))
+        self.assertNotEqual(file_fingerprint(paths[0]), file_fingerprint(paths[2]))
+        self.assertNotEqual(cache_key("fp", 24), cache_key("fp", 30))
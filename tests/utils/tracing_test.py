@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from utils.tracing import _active_tracer, in_trace_context, span, trace_run
+
+
+class TestTracing(unittest.TestCase):
+    @staticmethod
+    def _probe():
+        with span("probe"):
+            pass
+
+    def test_span_outside_run_is_noop(self):
+        with span("stage"):
+            pass
+
+    def test_trace_run_exports_chrome_trace(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            trace_path = os.path.join(tmp, "out.trace.json")
+            with trace_run(trace_path) as tracer:
+                with span("render", profile="final"):
+                    with span("encode"):
+                        pass
+                    thread = threading.Thread(target=in_trace_context(self._probe), name="worker")
+                    thread.start()
+                    thread.join()
+                    for _ in range(3):
+                        with span("decode_frame"):
+                            pass
+            with span("after_run"):
+                pass
+
+            with open(trace_path) as f:
+                events = json.load(f)["traceEvents"]
+
+        spans = [event for event in events if event["ph"] == "X"]
+        self.assertEqual(sorted({event["name"] for event in spans}), ["decode_frame", "encode", "probe", "render"])
+        thread_names = {event["args"]["name"] for event in events if event["ph"] == "M"}
+        self.assertIn("worker", thread_names)
+        render = next(event for event in spans if event["name"] == "render")
+        encode = next(event for event in spans if event["name"] == "encode")
+        self.assertEqual(render["args"], {"profile": "final"})
+        self.assertLessEqual(render["ts"], encode["ts"])
+        self.assertGreaterEqual(render["ts"] + render["dur"], encode["ts"] + encode["dur"])
+
+        summary = tracer.summary().splitlines()
+        self.assertIn("count", summary[0])
+        decode = next(line for line in summary if line.startswith("decode_frame"))
+        self.assertEqual(decode.split()[1], "3")
+
+    def test_overlapping_runs_record_their_own_spans(self):
+        barrier = threading.Barrier(2)
+        tracers = {}
+
+        def run(name):
+            with trace_run() as tracer:
+                barrier.wait()
+                with span(name):
+                    pass
+                barrier.wait()
+            tracers[name] = tracer
+
+        threads = [threading.Thread(target=run, args=(name,)) for name in ("preview", "render")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for name, tracer in tracers.items():
+            self.assertEqual([event["name"] for event in tracer.events()], [name])
+        self.assertIsNone(_active_tracer.get())
@@ -0,0 +1,22 @@
+import os
+import tempfile
+import unittest
+
+from utils.workspace import job_workspace
+
+
+class TestJobWorkspace(unittest.TestCase):
+    def test_workspaces_are_private_and_removed(self):
+        with tempfile.TemporaryDirectory() as root:
+            with job_workspace("job_", root) as first, job_workspace("job_", root) as second:
+                self.assertNotEqual(first, second)
+                with open(os.path.join(first, "video_list.txt"), "w") as f:
+                    f.write("file 'a.mp4'\n")
+            self.assertEqual(os.listdir(root), [])
+
+    def test_workspace_is_removed_on_error(self):
+        with tempfile.TemporaryDirectory() as root:
+            with self.assertRaises(RuntimeError):
+                with job_workspace("job_", root):
+                    raise RuntimeError("ffmpeg failed")
+            self.assertEqual(os.listdir(root), [])
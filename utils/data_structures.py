@@ -1,6 +1,8 @@
+import os
 from dataclasses import dataclass
 from enum import StrEnum
 
+import numpy as np
 from moviepy.video.io.VideoFileClip import VideoFileClip
 
 IMAGE_EXTENSIONS = ["png", "jpg"]
@@ -22,6 +24,17 @@ class TransitionTypeEnum(StrEnum):
     CROSS_FADE = "cross_fade"
 
 
+class RenderEngineEnum(StrEnum):
+    MOVIEPY = "moviepy"
+    FFMPEG = "ffmpeg"
+
+
+class RenderProfileEnum(StrEnum):
+    DRAFT = "draft"
+    PREVIEW = "preview"
+    FINAL = "final"
+
+
 class TimelinesTypeEnum(StrEnum):
     AUDIO_TIMELINE = "audio_timeline"
     VIDEO_TIMELINE = "video_timeline"
@@ -49,9 +62,100 @@ class MediaClip:
 class LoadedVideo:
     clip: VideoFileClip = None
     transition: TransitionTypeEnum = None
+    still_frame: np.ndarray = None  # formatted frame of photo entries
+    source: tuple[str, MediaClip, str] = None  # (file_path, entry, media_dir) the clip was loaded from
 
 
 INSTAGRAM_RESOLUTION = (1080, 1920)
+
+
+# x264 presets from the fastest to the best compression
+X264_PRESETS = ("ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow")
+# x264 preset names in the p1 (fastest) to p7 (best) scale of NVENC
+NVENC_PRESETS = {
+    "ultrafast": "p1",
+    "superfast": "p1",
+    "veryfast": "p2",
+    "faster": "p3",
+    "fast": "p3",
+    "medium": "p4",
+    "slow": "p5",
+    "slower": "p6",
+    "veryslow": "p7",
+}
+X264_PRESET_ENCODERS = ("libx264", "libx265")
+
+
+@dataclass(frozen=True)
+class RenderProfile:
+    name: RenderProfileEnum
+    resolution: tuple[int, int]
+    fps: int
+    preset: str
+    crf: int | None = None
+    bitrate: str | None = None  # e.g. "8M", used instead of crf when set
+    threads: int | None = None  # None: all cores but two
+    audio_codec: str = "aac"
+    audio_bitrate: str = "192k"
+
+    def thread_count(self) -> int:
+        return self.threads or max(1, (os.cpu_count() or 1) - 2)
+
+    def rate_control_args(self, codec="libx264") -> list[str]:
+        if self.bitrate:
+            return ["-b:v", self.bitrate]
+        if self.crf is None:
+            return []
+        if "nvenc" in codec:
+            return ["-rc", "vbr", "-cq", str(self.crf)]
+        return ["-crf", str(self.crf)]
+
+    def encoder_preset(self, codec="libx264") -> str | None:
+        """The preset in the vocabulary of the encoder, None when the encoder has no equivalent."""
+        if codec in X264_PRESET_ENCODERS:
+            return self.preset
+        if "nvenc" in codec:
+            return NVENC_PRESETS.get(self.preset)
+        return None
+
+    def video_args(self, codec="libx264") -> list[str]:
+        """ffmpeg output options of the video stream; scaling to the resolution is left to the caller's filters."""
+        preset = self.encoder_preset(codec)
+        args = ["-c:v", codec, *(["-preset", preset] if preset else [])]
+        args += [*self.rate_control_args(codec), "-pix_fmt", "yuv420p"]
+        args += ["-r", str(self.fps)]
+        if self.threads:
+            args += ["-threads", str(self.threads)]
+        return args
+
+    def audio_args(self) -> list[str]:
+        return ["-c:a", self.audio_codec, "-b:a", self.audio_bitrate]
+
+    def write_videofile_kwargs(self, codec) -> dict:
+        """The same settings as keyword arguments of moviepy's write_videofile."""
+        kwargs = {
+            "codec": codec,
+            "fps": self.fps,
+            "threads": self.thread_count(),
+            "ffmpeg_params": self.rate_control_args(codec),
+            "audio_codec": self.audio_codec,
+            "audio_bitrate": self.audio_bitrate,
+            "pixel_format": "yuv420p",
+        }
+        # moviepy always passes -preset, its own default is kept when the encoder has no equivalent
+        preset = self.encoder_preset(codec)
+        if preset:
+            kwargs["preset"] = preset
+        return kwargs
+
+
+RENDER_PROFILES = {
+    # Fast turnaround while editing
+    RenderProfileEnum.DRAFT: RenderProfile(RenderProfileEnum.DRAFT, (540, 960), 30, "ultrafast", crf=28),
+    RenderProfileEnum.PREVIEW: RenderProfile(RenderProfileEnum.PREVIEW, INSTAGRAM_RESOLUTION, 30, "ultrafast", crf=18),
+    # Best size for the quality; also used for the CFR intermediates of final renders
+    RenderProfileEnum.FINAL: RenderProfile(RenderProfileEnum.FINAL, INSTAGRAM_RESOLUTION, 30, "slow", crf=18),
+}
 PIXELS_PER_SEC = 50
 INIT_AUDIO_LENGTH_S = 10
 MAX_VIDEO_DURATION = 90
@@ -60,6 +164,64 @@ TIMELINE_START = "timeline_start"
 TIMELINE_END = "timeline_end"
 
 
+@dataclass
+class MediaInfo:
+    duration: float
+    width: int
+    height: int
+    r_fps: float
+    avg_fps: float
+    rotation: int
+    video_codec: str | None
+    pix_fmt: str | None
+    audio_codec: str | None
+    video_profile: str | None = None  # as reported by ffprobe, e.g. "High"
+    video_level: int | None = None  # level_idc, e.g. 40 for level 4.0
+    has_b_frames: int | None = None  # frames of B-frame reorder delay
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio_codec is not None
+
+    @property
+    def is_variable_framerate(self) -> bool:
+        # An unknown average (0/0) is no evidence of a variable frame rate
+        return self.avg_fps > 0 and self.r_fps != self.avg_fps
+
+
+@dataclass
+class EncoderCapabilities:
+    ffmpeg: str  # path|mtime|size of the ffmpeg binary the probe is valid for
+    encoders: dict[str, list[str]]  # working H.264/HEVC encoder -> supported options
+    presets: dict[str, list[str]]  # encoder -> named -preset values, empty when free-form (libx264)
+    preset_fps: dict[str, float]  # libx264 preset -> frames/sec of the synthetic benchmark
+
+    def has_encoder(self, name) -> bool:
+        return name in self.encoders
+
+    def ranked_presets(self) -> list[str]:
+        """libx264 presets from the fastest to the slowest on this machine."""
+        return sorted(self.preset_fps, key=self.preset_fps.get, reverse=True)
+
+    def fast_preset(self, preset, tolerance=0.9) -> str:
+        """
+        The best compressing libx264 preset that still runs at ``tolerance`` times the speed of ``preset`` on
+        this machine, so speed-bound renders get the quality the fast presets leave on the table. The preset
+        itself when it was not benchmarked.
+        """
+        if preset not in self.preset_fps:
+            return preset
+        floor = self.preset_fps[preset] * tolerance
+        fast_enough = [p for p in self.ranked_presets() if self.preset_fps[p] >= floor]
+        return max(fast_enough, key=X264_PRESETS.index)
+
+    def supports_preset(self, encoder, preset) -> bool:
+        if "preset" not in self.encoders.get(encoder, []):
+            return False
+        named = self.presets.get(encoder)
+        return not named or preset in named
+
+
 @dataclass
 class Segment:
     content: str
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
+logger = logging.getLogger(__name__)
+
+CACHE_ROOT = os.environ.get(
+    "REELS_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "instagram_reels_creator"),
+)
+FINGERPRINT_CHUNK = 1024 * 1024
+
+_key_locks = {}
+_key_locks_guard = threading.Lock()
+
+
+def file_fingerprint(path, chunk_size=FINGERPRINT_CHUNK) -> str:
+    """
+    Content fingerprint of a media file built from its size and its first and last chunk.
+    Copies of the same footage in different folders share a fingerprint, files with the same name do not.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(chunk_size))
+        if size > chunk_size:
+            f.seek(max(chunk_size, size - chunk_size))
+            digest.update(f.read(chunk_size))
+    return digest.hexdigest()
+
+
+def cache_key(*parts) -> str:
+    """Stable key for a fingerprint combined with the parameters that produced a cached artefact."""
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class DiskCache:
+    """
+    Persistent file cache shared by all runs and GUI sessions.
+    Entries are plain files named after their key; the file mtime records the last use, and the
+    least recently used entries are evicted once the directory grows over ``max_bytes``.
+    """
+
+    def __init__(self, name, max_bytes, root=CACHE_ROOT):
+        self.directory = os.path.join(root, name)
+        self.max_bytes = max_bytes
+
+    def path_for(self, key, ext) -> str:
+        return os.path.join(self.directory, f"{key}{ext}")
+
+    def get(self, key, ext) -> str | None:
+        path = self.path_for(key, ext)
+        if not os.path.exists(path):
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            return None
+        return path
+
+    def lock(self, key) -> threading.Lock:
+        """Per-entry lock, so concurrent producers of the same entry wait instead of duplicating the work."""
+        with _key_locks_guard:
+            return _key_locks.setdefault((self.directory, key), threading.Lock())
+
+    def temp_path_for(self, key, ext) -> str:
+        """Private path to write a new entry to before it is published with ``commit``."""
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f".{key}.{uuid.uuid4().hex}{ext}")
+
+    def commit(self, temp_path, key, ext) -> str:
+        path = self.path_for(key, ext)
+        os.replace(temp_path, path)
+        self.evict(keep=path)
+        return path
+
+    @staticmethod
+    def discard(temp_path):
+        try:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        except OSError as e:
+            logger.warning(f"Failed to delete {temp_path}: {e}")
+
+    def evict(self, keep=None):
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if name.startswith("."):
+                continue  # entry still being written
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+                logger.info(f"Evicted cache entry: {path}")
+            except OSError as e:
+                logger.warning(f"Failed to evict {path}: {e}")
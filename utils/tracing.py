@@ -0,0 +1,135 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
+logger = logging.getLogger(__name__)
+
+# Per context, so overlapping runs on different threads each record their own spans
+_active_tracer = contextvars.ContextVar("active_tracer", default=None)
+
+
+class Tracer:
+    """
+    Collects timed spans of one run from any thread and exports them as Chrome trace events
+    (chrome://tracing, https://ui.perfetto.dev). Spans on the same thread nest by time.
+    """
+
+    def __init__(self):
+        self._events = []
+        self._thread_names = {}
+        self._lock = threading.Lock()
+        self._origin_ns = time.perf_counter_ns()
+
+    @contextmanager
+    def span(self, name, category="render", **args):
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, start_ns, time.perf_counter_ns() - start_ns, category, **args)
+
+    def record(self, name, start_ns, duration_ns, category="render", **args):
+        """Add a span timed by the caller, e.g. work spread over many calls that gets a single span."""
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start_ns - self._origin_ns) / 1000,
+            "dur": duration_ns / 1000,
+            "pid": os.getpid(),
+            "tid": thread.ident,
+        }
+        if args:
+            event["args"] = {key: str(value) for key, value in args.items()}
+        with self._lock:
+            self._events.append(event)
+            self._thread_names.setdefault(thread.ident, thread.name)
+
+    def events(self) -> list[dict]:
+        with self._lock:
+            return list(self._events)
+
+    def export_chrome_trace(self, path):
+        with self._lock:
+            metadata = [
+                {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                for tid, name in self._thread_names.items()
+            ]
+            trace = {"traceEvents": metadata + self._events, "displayTimeUnit": "ms"}
+        with open(path, "w") as f:
+            json.dump(trace, f)
+
+    def summary(self) -> str:
+        """Table of span count, total, mean and max time per span name, the most expensive first."""
+        stats = {}
+        for event in self.events():
+            count, total, longest = stats.get(event["name"], (0, 0.0, 0.0))
+            stats[event["name"]] = (count + 1, total + event["dur"], max(longest, event["dur"]))
+
+        width = max([len("stage")] + [len(name) for name in stats])
+        lines = [f"{'stage':<{width}}  {'count':>6}  {'total s':>9}  {'mean ms':>9}  {'max ms':>9}"]
+        for name, (count, total, longest) in sorted(stats.items(), key=lambda item: item[1][1], reverse=True):
+            lines.append(
+                f"{name:<{width}}  {count:>6}  {total / 1e6:>9.3f}  {total / count / 1e3:>9.2f}  {longest / 1e3:>9.2f}"
+            )
+        return "\n".join(lines)
+
+
+@contextmanager
+def span(name, category="render", **args):
+    """Time a stage of the active traced run; a no-op outside of trace_run."""
+    tracer = _active_tracer.get()
+    if tracer is None:
+        yield
+        return
+    with tracer.span(name, category, **args):
+        yield
+
+
+def record_span(name, start_ns, duration_ns, category="render", **args):
+    """Record a span timed with time.perf_counter_ns in the active traced run; a no-op outside of trace_run."""
+    tracer = _active_tracer.get()
+    if tracer is not None:
+        tracer.record(name, start_ns, duration_ns, category, **args)
+
+
+@contextmanager
+def trace_run(trace_path=None):
+    """
+    Trace everything inside the block. On exit the spans are written to trace_path as a Chrome trace
+    and a per-stage summary is logged.
+    """
+    tracer = Tracer()
+    token = _active_tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _active_tracer.reset(token)
+        if trace_path:
+            try:
+                tracer.export_chrome_trace(trace_path)
+                logger.info(f"Trace written to {trace_path}")
+            except OSError as e:
+                logger.warning(f"Failed to write trace {trace_path}: {e}")
+        if tracer.events():
+            logger.info(f"Render stage timings:\n{tracer.summary()}")
+
+
+def in_trace_context(fn):
+    """
+    Wrap fn to run in a copy of the caller's context. Threads start with an empty context, so work handed to
+    threads or pools of a traced run goes through this to record its spans in the run.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A context can only be entered by one thread at a time
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
@@ -0,0 +1,26 @@
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
+logger = logging.getLogger(__name__)
+
+# Intermediate files of running jobs; point it at a tmpfs such as /dev/shm to keep them off the disk
+SCRATCH_ROOT = os.environ.get("REELS_SCRATCH_DIR", tempfile.gettempdir())
+
+
+@contextmanager
+def job_workspace(prefix="job_", root=SCRATCH_ROOT):
+    """
+    Private scratch directory of one job under ``root``, removed with everything in it when the block exits,
+    so concurrent jobs never share intermediate files.
+    """
+    os.makedirs(root, exist_ok=True)
+    workspace = tempfile.mkdtemp(prefix=prefix, dir=root)
+    try:
+        yield workspace
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+        logger.debug(f"Removed workspace {workspace}")